@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# advisor.py
+
+# To advise without blocking the event loop
+import asyncio
+
+# To seed the deals
+import random
+
+# To stop sampling in time
+import time
+
+# To get the advisor's budget
+from config import SETTINGS
+
+# Round resolution rules
+from engine import cards_of, draw_winner
+
+# To deal the unseen cards at random
+from ismcts import determinize
+
+# Meld tables and the deadwood solver
+from melds import ACCEPTORS, MELDS_3_BY_CARD, POINTS, solve_deadwood
+
+
+# Returns a seat's chance of winning a called draw by calling it (if the seat is on turn) or by challenging and
+# folding (if another seat called it), estimated over random deals of the unseen cards. Every other seat with an
+# exposed meld is assumed to challenge, and every hand to be melded as well as it can be. Stops after samples deals
+# or when seconds pass.
+def draw_odds(view, samples=None, seconds=None, seed=None):
+    samples = samples if samples != None else SETTINGS.ADVISOR_SAMPLES
+    deadline = time.monotonic() + seconds if seconds != None else None
+    rng = random.Random(seed)
+    
+    state = view.state
+    caller = state.order[0]
+    points = {view.player: solve_deadwood(state.hands[view.player])[0]}
+    
+    wins = 0
+    done = 0
+    while done < samples and (deadline == None or time.monotonic() < deadline):
+        deal = determinize(view, rng)
+        for i in range(len(state.hands)):
+            if i != view.player and (i == caller or state.melds[i]):
+                points[i] = solve_deadwood(deal.hands[i])[0]
+        
+        if draw_winner(points, state.last_draw, state.order) == view.player:
+            wins += 1
+        done += 1
+    
+    odds = {'samples': done}
+    if caller == view.player:
+        odds['draw'] = wins / done if done else None
+    else:
+        odds['challenge'] = wins / done if done else None
+        odds['fold'] = 0.0
+    
+    return odds
+
+
+# Returns draw_odds computed in a thread, or None if it misses the budget (seconds, by default ADVISOR_BUDGET)
+async def advise_draw(view, samples=None, seconds=None):
+    seconds = seconds if seconds != None else SETTINGS.ADVISOR_BUDGET
+    
+    try:
+        async with asyncio.timeout(seconds):
+            return await asyncio.to_thread(draw_odds, view, samples, seconds * 0.9)
+    
+    except TimeoutError:
+        return None
+
+
+# Returns advice to show beside an option, e.g. ' (wins 63% of 2000 deals)'
+def describe_odds(odds, option):
+    if odds == None or odds.get(option) == None:
+        return ''
+    
+    return f' (wins {odds[option]:.0%} of {odds["samples"]} deals)'
+
+
+# Returns every card a seat could discard, best first, as (card, deadwood, risk, lay_off): the unmelded points left
+# after discarding it, the chance the next player holds two cards that meld with it (the only way to pick up a
+# discard), and whether it fits an exposed meld and so could be laid off instead. Cards that could be laid off come
+# last; the rest are ranked by deadwood plus risk times risk_points. Reads the unseen cards, and the cards the next
+# player picked up from the discard, from the view's tracker.
+def rank_discards(view, risk_points=None, building_weight=None):
+    risk_points = risk_points if risk_points != None else SETTINGS.DISCARD_RISK_POINTS
+    building_weight = building_weight if building_weight != None else SETTINGS.DISCARD_BUILDING_WEIGHT
+    
+    state = view.state
+    hand = state.hands[view.player]
+    after = state.order[(state.order.index(view.player) + 1) % len(state.order)]
+    
+    slots = 0
+    for melds in state.melds:
+        for meld in melds:
+            slots |= ACCEPTORS.get(meld, 0)
+    
+    # Cards the next player is likely collecting: those sharing a set or run with a card they picked up, and those
+    # their exposed melds accept
+    building = 0
+    for picked in cards_of(view.tracker.picked[after]):
+        for meld in MELDS_3_BY_CARD[picked]:
+            building |= meld
+    for meld in state.melds[after]:
+        building |= ACCEPTORS.get(meld, 0)
+    
+    ranked = list()
+    for card in cards_of(hand):
+        # Chance the next player holds none of the pairs that meld with the card
+        none = 1.0
+        for meld in MELDS_3_BY_CARD[card]:
+            none *= 1.0 - view.tracker.chance_all(meld & ~(1 << card), after)
+        
+        risk = 1.0 - none
+        if building >> card & 1:
+            risk = min(1.0, risk * building_weight)
+        
+        ranked.append((card, solve_deadwood(hand & ~(1 << card))[0], risk, bool(slots >> card & 1)))
+    
+    ranked.sort(key=lambda item: (item[3], item[1] + item[2] * risk_points, -POINTS[item[0]]))
+    
+    return ranked
+
+
+# Returns advice on a ranked discard, e.g. '23 points left, 4% chance bot1 can pick it up'
+def describe_discard(item, name):
+    card, deadwood, risk, lay_off = item
+    
+    advice = f'{deadwood} points left, {risk:.0%} chance {name} can pick it up'
+    if lay_off:
+        advice += ' (it could be laid off instead)'
+    
+    return advice
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# batch.py
+
+# To parse command line options
+import argparse
+
+# To time runs
+import time
+
+# To step many games at once
+import numpy as np
+
+# To get game constants
+from config import CONSTANTS
+
+# Card numbering and points shared with the rest of the game
+from melds import NUM_RANKS, NUM_SUITS, NUM_CARDS, POINTS
+
+# To report results in the same format as simulate.py
+from simulate import new_stats, report
+
+POINTS_ARRAY = np.array(POINTS, dtype=np.int16)
+
+
+# K games held as arrays and stepped in lockstep. Every seat plays the same simple policy: draw from the deck,
+# expose every set and then every run in hand, and discard the highest card left ('highest') or a random one
+# ('random'). Nobody picks from the discard, lays off or calls a draw.
+class BatchGames:
+    def __init__(self, num_games, seed=None, discard='highest'):
+        self.rng = np.random.default_rng(seed)
+        self.num_games = num_games
+        self.discard_policy = discard
+        self.games = np.arange(num_games)
+        
+        num_players = CONSTANTS.NUM_PLAYERS
+        
+        # Shuffled decks (one permutation per row) and random turn orders
+        self.deck = self.rng.permuted(np.tile(np.arange(NUM_CARDS, dtype=np.int8), (num_games, 1)), axis=1)
+        self.order = self.rng.permuted(np.tile(np.arange(num_players, dtype=np.int8), (num_games, 1)), axis=1)
+        
+        # Hands, melded cards' owners (-1 for none) and the discard pile
+        self.hands = np.zeros((num_games, num_players, NUM_CARDS), dtype=bool)
+        self.owner = np.full((num_games, NUM_CARDS), -1, dtype=np.int8)
+        self.discard = np.zeros((num_games, NUM_CARDS), dtype=bool)
+        
+        # Every game draws one card per turn, so the top of every deck is at the same position
+        self.top = 0
+        self.turn = 0
+        
+        # -1 while a game is ongoing, -2 if nobody exposed a meld, otherwise the winner
+        self.winner = np.full(num_games, -1, dtype=np.int8)
+        self.reason = np.zeros(num_games, dtype=np.int8)
+        self.turns = np.zeros(num_games, dtype=np.int16)
+        
+        self._deal()
+    
+    
+    # Deal 12 cards to each player in turn order
+    def _deal(self):
+        for _ in range(CONSTANTS.STARTING_HAND_SIZE):
+            for seat in range(self.order.shape[1]):
+                self.hands[self.games, self.order[:, seat], self.deck[:, self.top]] = True
+                self.top += 1
+    
+    
+    # Returns whether every game is over
+    def done(self):
+        return bool((self.winner != -1).all())
+    
+    
+    # Play one turn of every ongoing game
+    def step(self):
+        active = self.winner == -1
+        games = self.games[active]
+        player = self.order[active, self.turn % self.order.shape[1]]
+        
+        # Draw from the deck
+        hand = self.hands[games, player]
+        hand[np.arange(len(games)), self.deck[active, self.top]] = True
+        self.top += 1
+        
+        # Expose every set, then every run in what is left
+        by_rank = hand.reshape(-1, NUM_SUITS, NUM_RANKS)
+        sets = by_rank & (by_rank.sum(axis=1) >= 3)[:, None, :]
+        rest = by_rank & ~sets
+        starts = rest[:, :, :-2] & rest[:, :, 1:-1] & rest[:, :, 2:]
+        runs = np.zeros_like(rest)
+        runs[:, :, :-2] |= starts
+        runs[:, :, 1:-1] |= starts
+        runs[:, :, 2:] |= starts
+        melded = (sets | runs).reshape(-1, NUM_CARDS)
+        
+        owner = self.owner[games]
+        owner[melded] = np.broadcast_to(player[:, None], melded.shape)[melded]
+        self.owner[games] = owner
+        hand &= ~melded
+        
+        # Discard
+        if self.discard_policy == 'random':
+            keys = self.rng.random(hand.shape)
+        else:
+            keys = POINTS_ARRAY * NUM_CARDS + np.arange(NUM_CARDS)
+        card = np.where(hand, keys, -1).argmax(axis=1)
+        can_discard = hand.any(axis=1)
+        hand[np.arange(len(games))[can_discard], card[can_discard]] = False
+        self.discard[games[can_discard], card[can_discard]] = True
+        
+        self.hands[games, player] = hand
+        self.turns[games] = self.turn + 1
+        
+        # Players who emptied their hand win
+        out = ~hand.any(axis=1)
+        self.winner[games[out]] = player[out]
+        self.reason[games[out]] = 0
+        
+        # Deck exhausted: lowest unmelded points among players with an exposed meld wins
+        if self.top == NUM_CARDS:
+            self._tally(games[~out])
+        
+        self.turn += 1
+    
+    
+    # Resolve games whose deck ran out
+    def _tally(self, games):
+        if not len(games):
+            return
+        
+        num_players = self.order.shape[1]
+        players = np.arange(num_players)
+        has_meld = (self.owner[games][:, None, :] == players[None, :, None]).any(axis=2)
+        points = (self.hands[games] * POINTS_ARRAY).sum(axis=2)
+        points = np.where(has_meld, points, np.iinfo(np.int16).max)
+        
+        # Ties go to the player who drew the last card, then to the next player in turn order
+        last_draw = self.order[games, self.turn % num_players]
+        next_player = self.order[games, (self.turn + 1) % num_players]
+        top = points == points.min(axis=1)[:, None]
+        tied = top.sum(axis=1) > 1
+        winner = points.argmin(axis=1).astype(np.int8)
+        winner = np.where(tied & top[np.arange(len(games)), last_draw], last_draw, np.where(tied, next_player, winner))
+        winner = np.where(has_meld.any(axis=1), winner, -2)
+        
+        self.winner[games] = winner
+        self.reason[games] = 1
+    
+    
+    # Play every game to the end
+    def run(self):
+        while not self.done():
+            self.step()
+        return self
+    
+    
+    # Returns the results in simulate.py's statistics format
+    def stats(self):
+        stats = new_stats()
+        stats['games'] = self.num_games
+        
+        won = self.winner >= 0
+        seat = (self.order == self.winner[:, None]).argmax(axis=1)
+        for i, wins in enumerate(np.bincount(seat[won], minlength=self.order.shape[1])):
+            stats['wins_by_seat'][i] = int(wins)
+        stats['nobody'] = int((self.winner == -2).sum())
+        stats['reasons']['out'] = int((self.reason == 0).sum())
+        stats['reasons']['exhausted'] = int((self.reason == 1).sum())
+        
+        # Turns counted like engine.GameState.turns (completed turns before the last)
+        for length, count in enumerate(np.bincount(self.turns - 1)):
+            if count:
+                stats['lengths'][length] = int(count)
+        
+        return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate many Tong-its games in lockstep with NumPy')
+    parser.add_argument('-n', '--games', type=int, default=100000)
+    parser.add_argument('-s', '--seed', type=int, default=None)
+    parser.add_argument('-d', '--discard', choices=['highest', 'random'], default='highest')
+    args = parser.parse_args()
+    
+    start = time.perf_counter()
+    games = BatchGames(args.games, args.seed, args.discard).run()
+    elapsed = time.perf_counter() - start
+    
+    report(games.stats())
+    print(f'{args.games / elapsed:.0f} games/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+# bot.py
+
+# To run bots alongside the host
+import asyncio
+
+# To run searches on every core
+import concurrent.futures
+import os
+
+# To give each decision a time budget
+import time
+
+# To seed strategies
+import random
+
+# To declare what every strategy implements
+import abc
+
+# To talk to the host like a client does
+from config import SETTINGS, send_message, set_codec
+
+# To turn card ids into the cards sent over the wire
+from server import CARDS, decompose
+
+# The game rules, to list a seat's legal actions
+from engine import GameState, PICK, PLAY, cards_of, from_server, legal_actions
+
+# To read and score hands
+from melds import card_index, hand_mask
+
+# To track the cards a bot has seen
+from tracker import CardTracker
+
+# To follow the host's state stream
+from stream import StateMirror
+
+# Heuristics and searches the strategies are built on
+from policies import GreedyPolicy
+from advisor import rank_discards
+import ismcts
+
+
+# What a seat can see of a game: the engine state with the hidden cards (the deck, the other hands) left out,
+# and how many cards are hidden in each place
+class View:
+    __slots__ = ('state', 'player', 'deck_size', 'num_cards', 'tracker')
+    
+    def __init__(self, state, player, deck_size, num_cards, tracker=None):
+        self.state = state
+        self.player = player
+        self.deck_size = deck_size
+        self.num_cards = num_cards
+        
+        # The seat's card tracker, if it keeps one
+        self.tracker = tracker
+
+
+# Returns the view of a seat given a gamestate and its player messages
+def observe(gamestate, players, phase=PICK, tracker=None):
+    player = gamestate['id']
+    
+    hands = tuple(hand_mask(players[i]['hand']) if i == player else 0 for i in range(len(players)))
+    melds = tuple(tuple(hand_mask(meld) for meld in players[i]['melds'] if meld) for i in range(len(players)))
+    can_draw = tuple(players[i]['can_draw'] for i in range(len(players)))
+    discard = tuple(card_index(card) for card in gamestate['discard'])
+    state = GameState((), discard, hands, melds, tuple(gamestate['order']), can_draw, last_draw=gamestate.get('last_draw'), phase=phase)
+    
+    num_cards = tuple(len(players[i]['hand']) if i == player else players[i]['num_cards'] for i in range(len(players)))
+    
+    return View(state, player, gamestate['deck_size'], num_cards, tracker)
+
+
+# Returns the view of a seat of an engine state
+def observe_state(state, player, tracker=None):
+    hidden = state._replace(deck=(), cursor=0, hands=tuple(hand if i == player else 0 for i, hand in enumerate(state.hands)))
+    
+    return View(hidden, player, state.cursor, tuple(hand.bit_count() for hand in state.hands), tracker)
+
+
+# Returns the view of a seat at the host
+def observe_server(server, player, phase=PICK, tracker=None):
+    return observe_state(from_server(server, phase), player, tracker)
+
+
+# Makes a bot's decisions; choose() must return one of the legal actions, and should return by the deadline
+class Strategy(abc.ABC):
+    name = 'strategy'
+    
+    def __init__(self, rng=None, budget=None):
+        self.rng = rng if rng != None else random.Random()
+        
+        # Seconds per decision
+        self.budget = budget if budget != None else SETTINGS.BOT_BUDGET
+    
+    
+    # Prepares anything the first decision would otherwise wait on; called when the strategy takes a seat
+    def start(self):
+        pass
+    
+    
+    @abc.abstractmethod
+    def choose(self, view, actions, deadline):
+        pass
+
+
+# Plays the greedy policy: melds and lays off what it can, sheds the most deadwood, draws and challenges on low hands
+class HeuristicStrategy(Strategy):
+    name = 'heuristic'
+    
+    def __init__(self, rng=None, budget=None, draw_threshold=10):
+        super().__init__(rng, budget)
+        self.policy = GreedyPolicy(self.rng, draw_threshold)
+    
+    
+    def choose(self, view, actions, deadline):
+        return self.policy.choose(view.state, view.player, actions)
+
+
+# Plays the heuristic strategy, but discards the card the discard advisor ranks best: the fewest points left
+# weighed against the chance the next player can pick it up
+class CautiousStrategy(HeuristicStrategy):
+    name = 'cautious'
+    
+    def choose(self, view, actions, deadline):
+        action = super().choose(view, actions, deadline)
+        if action[0] != 'discard' or view.tracker == None:
+            return action
+        
+        return ('discard', rank_discards(view)[0][0])
+
+
+# Searches with information set MCTS, one independent search per worker process merged at the root. Stops at the
+# deadline or after iterations playouts in total, whichever comes first.
+class ISMCTSStrategy(Strategy):
+    name = 'ismcts'
+    
+    def __init__(self, rng=None, budget=None, iterations=None, workers=None, exploration=0.7):
+        super().__init__(rng, budget)
+        self.iterations = iterations
+        self.workers = workers if workers != None else os.cpu_count()
+        self.exploration = exploration
+        
+        # Started when the strategy takes a seat (or on the first decision)
+        self.pool = None
+    
+    
+    # Starts the worker processes and warms them up, so the first decisions do not spend their budget on it
+    def start(self):
+        if self.workers <= 1 or self.pool != None:
+            return
+        
+        self.pool = concurrent.futures.ProcessPoolExecutor(self.workers)
+        for _ in range(self.workers):
+            self.pool.submit(ismcts.warm_up)
+    
+    
+    def choose(self, view, actions, deadline):
+        if len(actions) == 1:
+            return actions[0]
+        
+        # Not searched: a challenge is never worse than a fold. A folded hand cannot win, while a challenge only
+        # adds the hand to the comparison with the caller's, which leaves the other outcomes as they were.
+        if actions[-1] == ('fold',):
+            return actions[0]
+        
+        # Leave time to collect the results
+        remaining = deadline - time.monotonic()
+        search_deadline = time.monotonic() + remaining * 0.8
+        
+        if self.workers <= 1:
+            results = [ismcts.search(view, None, self.iterations, self.rng.getrandbits(64), self.exploration, search_deadline)]
+        
+        else:
+            self.start()
+            
+            # Searches stop at the shared deadline, so one that starts late (behind a warm-up or a search still
+            # finishing) does not hold up the next decision
+            iterations = -(-self.iterations // self.workers) if self.iterations != None else None
+            futures = [self.pool.submit(ismcts.search, view, None, iterations, self.rng.getrandbits(64), self.exploration, search_deadline) for _ in range(self.workers)]
+            done, pending = concurrent.futures.wait(futures, timeout=max(0, remaining * 0.9))
+            for future in pending:
+                future.cancel()
+            results = [future.result() for future in done]
+        
+        # Most visited action across the searches
+        visits = dict()
+        for result in results:
+            for action in result:
+                visits[action] = visits.get(action, 0) + result[action][0]
+        
+        legal = [action for action in actions if action in visits]
+        if not legal:
+            return actions[0]
+        
+        return max(legal, key=visits.__getitem__)
+
+
+# Strategies by name
+STRATEGIES = {strategy.name: strategy for strategy in (HeuristicStrategy, CautiousStrategy, ISMCTSStrategy)}
+
+# Actions to take when a strategy runs out of time, in order of preference
+FALLBACKS = ('pick_deck', 'fold', 'discard')
+
+
+# Returns the cards of a mask as sent over the wire
+def wire_cards(mask):
+    return decompose([CARDS[card] for card in cards_of(mask)])
+
+
+# One direction of an in-memory connection; what is written to it can be read from its reader
+class Pipe:
+    def __init__(self):
+        self.reader = asyncio.StreamReader()
+    
+    
+    def write(self, data):
+        self.reader.feed_data(data)
+    
+    
+    async def drain(self):
+        pass
+    
+    
+    def close(self):
+        self.reader.feed_eof()
+
+
+# A seat played by a strategy, connected to the host in memory so the host treats it like any client
+class BotSeat:
+    def __init__(self, strategy):
+        self.strategy = strategy
+        
+        self.to_bot = Pipe()
+        self.to_host = Pipe()
+        self.task = None
+        
+        # Whether the bot picked a card this turn, and whether the game it is playing has ended
+        self.picked = False
+        self.ending = False
+        
+        # The cards the bot has seen
+        self.tracker = CardTracker()
+        
+        # The bot's view of the game, kept up to date from the host's state stream
+        self.mirror = StateMirror(self.to_bot.reader, self.to_host)
+    
+    
+    # Starts the bot and returns the (reader, writer, name) the host uses for a client
+    def connect(self, name):
+        # Both ends are in this process, so they agree on the preferred codec without a handshake
+        set_codec(self.to_bot, SETTINGS.CODEC)
+        set_codec(self.to_host, SETTINGS.CODEC)
+        
+        self.strategy.start()
+        self.task = asyncio.create_task(self.run())
+        return (self.to_host.reader, self.to_bot, name)
+    
+    
+    # Returns the next gamestate and its player messages
+    async def receive(self):
+        return await self.mirror.receive()
+    
+    
+    # Returns the strategy's action, or a fallback if it runs out of time
+    async def decide(self, view, actions):
+        try:
+            async with asyncio.timeout(self.strategy.budget):
+                return await asyncio.to_thread(self.strategy.choose, view, actions, time.monotonic() + self.strategy.budget)
+        
+        except TimeoutError:
+            for command in FALLBACKS:
+                for action in actions:
+                    if action[0] == command:
+                        return action
+            return actions[0]
+    
+    
+    # Returns the message that performs an action during a turn
+    def message(self, action):
+        command = action[0]
+        
+        if command == 'pick_discard' or command == 'expose':
+            return {'command': command, 'cards': wire_cards(action[1])}
+        
+        if command == 'lay_off':
+            return {'command': command, 'card': wire_cards(1 << action[1])[0], 'player_id': action[2], 'meld_id': action[3]}
+        
+        if command == 'discard':
+            return {'command': command, 'card': wire_cards(1 << action[1])[0]}
+        
+        return {'command': command}
+    
+    
+    # Play every game the host starts, answering each gamestate the way the client does
+    async def run(self):
+        while True:
+            gamestate, players = await self.receive()
+            player = gamestate['id']
+            self.tracker.update(gamestate, players)
+            
+            # Game in progress: act if it is the bot's turn
+            if gamestate['winner'] == -1:
+                self.ending = False
+                if gamestate['order'][0] != player:
+                    continue
+                
+                view = observe(gamestate, players, PLAY if self.picked else PICK, self.tracker)
+                action = await self.decide(view, legal_actions(view.state))
+                
+                self.picked = action[0] != 'discard' and action[0] != 'draw'
+                await send_message(self.to_host, self.message(action))
+            
+            # Game over: respond to a draw someone else called (hands are tallied by the host)
+            elif not self.ending:
+                self.ending = True
+                self.picked = False
+                
+                if gamestate['winner'] == -3 and gamestate['order'][0] != player:
+                    view = observe(gamestate, players, tracker=self.tracker)
+                    actions = ([('challenge',)] if players[player]['melds'] else []) + [('fold',)]
+                    await send_message(self.to_host, {'draw_response': (await self.decide(view, actions))[0]})
+            
+            # Final gamestate: always accept a rematch
+            else:
+                self.ending = False
+                await send_message(self.to_host, {'command': 'rematch', 'value': 1})
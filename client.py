@@ -11,7 +11,7 @@ import os
 import time
 
 # Predefined constants and helper functions
-from config import Settings, get_message, send_message
+from config import SETTINGS, get_message, send_message
 
 class Client:
     def __init__(self):
@@ -88,7 +88,7 @@ class Client:
         while not self.shutdown_flag.is_set():
             
             # Wait for PING_INTERVAL seconds
-            await asyncio.sleep(Settings().PING_INTERVAL)
+            await asyncio.sleep(SETTINGS.PING_INTERVAL)
             
             # Ping host
             if (await send_message(self.writer, {'command': 'ping'}) == 0):
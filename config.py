@@ -3,19 +3,65 @@
 
 import json
 
+# To read configuration overrides
+import os
+
+# To pack binary frames
+import struct
+
+# To remember each connection's codec only while the connection exists
+import weakref
+
+# Version of the game protocol (gamestates streamed as numbered deltas, each with a public and a private part, and
+# hands tallied by the host, so only the players answering a called draw reply when a game ends); hosts refuse
+# clients that speak another
+PROTOCOL_VERSION = 3
+
+# Binary frames start with this byte; a JSON frame starts with the top byte of its 8-byte length, which is always 0
+BINARY_MAGIC = 0xB1
+
+# Binary frame header: the magic byte and the payload size
+BINARY_HEADER = struct.Struct('>BI')
+
+# Bytes read to tell the frame formats apart (a whole binary header, the first bytes of a JSON header)
+PEEK_SIZE = BINARY_HEADER.size
+
 # Returns message as dict
 async def get_message(reader):
-    message_size = int.from_bytes((await reader.readexactly(8)), 'big')
-    return json.loads((await reader.readexactly(message_size)).decode())
+    header = await reader.readexactly(PEEK_SIZE)
+    if header[0] == BINARY_MAGIC:
+        return BINARY.decode(await reader.readexactly(BINARY_HEADER.unpack(header)[1]))
+    
+    message_size = int.from_bytes(header + (await reader.readexactly(8 - PEEK_SIZE)), 'big')
+    return JSON.decode(await reader.readexactly(message_size))
 
 
-# Sends a message
+# Sends a message in the codec chosen for the connection
 async def send_message(writer, message_json):
-    message = str(json.dumps(message_json)).encode()
-    message_size = len(message).to_bytes(8, 'big')
+    return await send_frame(writer, get_codec(writer).frame(message_json))
+
+
+# Sends a frame built by the connection's codec
+async def send_frame(writer, frame):
+    if not write_frame(writer, frame):
+        return 0
     
+    return await drain(writer)
+
+
+# Queues a frame on the connection without waiting for it to be taken
+def write_frame(writer, frame):
+    try:
+        writer.write(frame)
+        return 1
+        
+    except (ConnectionResetError, BrokenPipeError):
+        return 0
+
+
+# Waits until the connection has taken the frames queued on it
+async def drain(writer):
     try:
-        writer.write(message_size + message)
         await writer.drain()
         return 1
         
@@ -23,7 +69,212 @@ async def send_message(writer, message_json):
         return 0
 
 
-class Settings:
+# JSON frames: an 8-byte length and the JSON text; readable by every version of the game and easy to debug
+class JsonCodec:
+    name = 'json'
+    
+    def frame(self, message):
+        data = json.dumps(message).encode()
+        return len(data).to_bytes(8, 'big') + data
+    
+    
+    # Returns a value encoded on its own, to be spliced into frames by frame_fragments
+    def fragment(self, value):
+        return json.dumps(value).encode()
+    
+    
+    # Returns the frame of a message whose values were encoded as fragments, {key: fragment}
+    def frame_fragments(self, fragments):
+        data = b'{' + b', '.join(json.dumps(key).encode() + b': ' + fragments[key] for key in fragments) + b'}'
+        return len(data).to_bytes(8, 'big') + data
+    
+    
+    def decode(self, data):
+        return json.loads(data.decode())
+
+
+# Binary frames: a struct-packed header and tagged values, with every card as one byte and the protocol's keys and
+# words (commands, statuses) as one-byte enums. Other strings and numbers are kept as they are, so any message
+# that can be sent as JSON decodes to the same message.
+class BinaryCodec:
+    name = 'binary'
+    
+    # Value tags
+    NONE, FALSE, TRUE, INT8, INT, FLOAT, WORD, STRING, LIST, DICT, CARD, CARDS = range(12)
+    
+    # Keys and words sent as enums; only ever append to this, since both ends must agree on the positions
+    WORDS = (
+        'command', 'status', 'name', 'client_names', 'card', 'cards', 'player_id', 'meld_id', 'value',
+        'draw_response', 'melds', 'deck_size', 'discard', 'order', 'id', 'winner', 'score', 'hand', 'num_cards',
+        'can_draw', 'codec', 'codecs',
+        'join', 'success', 'failure', 'refresh', 'kick', 'start', 'get_client_names', 'ping', 'leave',
+        'pick_deck', 'pick_discard', 'draw', 'expose', 'lay_off', 'rematch', 'challenge', 'fold', 'json', 'binary',
+        'seq', 'snapshot', 'delta', 'gamestate', 'players', 'resync', 'set', 'player', 'meld', 'private', 'last_draw'
+    )
+    
+    def __init__(self, ranks, suits):
+        # Encoded words and small integers
+        self.words = {word: bytes((self.WORD, i)) for i, word in enumerate(self.WORDS)}
+        self.small_ints = {i: bytes((self.INT8, i & 0xFF)) for i in range(-128, 128)}
+        
+        # Cards are [rank, suit] pairs on the wire, sent as their card id
+        self.cards = tuple((rank, suit) for suit in suits for rank in ranks)
+        self.card_ids = {card: i for i, card in enumerate(self.cards)}
+    
+    
+    def frame(self, message):
+        data = bytearray(PEEK_SIZE)
+        self._encode(message, data)
+        BINARY_HEADER.pack_into(data, 0, BINARY_MAGIC, len(data) - PEEK_SIZE)
+        return data
+    
+    
+    # Returns a value encoded on its own, to be spliced into frames by frame_fragments
+    def fragment(self, value):
+        data = bytearray()
+        self._encode(value, data)
+        return bytes(data)
+    
+    
+    # Returns the frame of a message whose values were encoded as fragments, {key: fragment}
+    def frame_fragments(self, fragments):
+        data = bytearray(PEEK_SIZE)
+        data += struct.pack('>BH', self.DICT, len(fragments))
+        for key in fragments:
+            self._encode(key, data)
+            data += fragments[key]
+        BINARY_HEADER.pack_into(data, 0, BINARY_MAGIC, len(data) - PEEK_SIZE)
+        return data
+    
+    
+    def _encode(self, value, data):
+        kind = type(value)
+        
+        if kind is str:
+            if value in self.words:
+                data += self.words[value]
+            else:
+                encoded = value.encode()
+                data += struct.pack('>BI', self.STRING, len(encoded))
+                data += encoded
+        
+        elif kind is list or kind is tuple:
+            # A card, or a list of cards
+            card = self._card_id(value)
+            if card != None:
+                data += bytes((self.CARD, card))
+                return
+            
+            cards = [self._card_id(item) for item in value]
+            if cards and None not in cards:
+                data += bytes((self.CARDS, len(cards)))
+                data += bytes(cards)
+                return
+            
+            data += struct.pack('>BH', self.LIST, len(value))
+            for item in value:
+                self._encode(item, data)
+        
+        elif kind is dict:
+            data += struct.pack('>BH', self.DICT, len(value))
+            for key in value:
+                self._encode(key, data)
+                self._encode(value[key], data)
+        
+        elif kind is int:
+            if value in self.small_ints:
+                data += self.small_ints[value]
+            else:
+                data += struct.pack('>Bq', self.INT, value)
+        
+        elif value is None:
+            data.append(self.NONE)
+        
+        elif kind is bool:
+            data.append(self.TRUE if value else self.FALSE)
+        
+        elif kind is float:
+            data += struct.pack('>Bd', self.FLOAT, value)
+        
+        else:
+            raise TypeError(f'{kind.__name__} cannot be sent')
+    
+    
+    # Returns the id of a [rank, suit] pair, or None for anything else
+    def _card_id(self, value):
+        if (type(value) is list or type(value) is tuple) and len(value) == 2 and type(value[0]) is str and type(value[1]) is str:
+            return self.card_ids.get((value[0], value[1]))
+        return None
+    
+    
+    def decode(self, data):
+        return self._decode(data, 0)[0]
+    
+    
+    # Returns the value at a position and the position after it
+    def _decode(self, data, position):
+        tag = data[position]
+        position += 1
+        
+        if tag == self.WORD:
+            return self.WORDS[data[position]], position + 1
+        if tag == self.INT8:
+            value = data[position]
+            return value - 256 if value > 127 else value, position + 1
+        if tag == self.CARDS:
+            end = position + 1 + data[position]
+            return [list(self.cards[card]) for card in data[position + 1:end]], end
+        if tag == self.CARD:
+            return list(self.cards[data[position]]), position + 1
+        
+        if tag == self.DICT:
+            size = data[position] << 8 | data[position + 1]
+            position += 2
+            items = dict()
+            for _ in range(size):
+                key, position = self._decode(data, position)
+                items[key], position = self._decode(data, position)
+            return items, position
+        
+        if tag == self.LIST:
+            size = data[position] << 8 | data[position + 1]
+            position += 2
+            items = list()
+            for _ in range(size):
+                item, position = self._decode(data, position)
+                items.append(item)
+            return items, position
+        
+        if tag == self.NONE:
+            return None, position
+        if tag == self.FALSE:
+            return False, position
+        if tag == self.TRUE:
+            return True, position
+        if tag == self.INT:
+            return struct.unpack_from('>q', data, position)[0], position + 8
+        if tag == self.FLOAT:
+            return struct.unpack_from('>d', data, position)[0], position + 8
+        if tag == self.STRING:
+            size = struct.unpack_from('>I', data, position)[0]
+            return bytes(data[position + 4:position + 4 + size]).decode(), position + 4 + size
+        
+        raise ValueError(f'unknown binary tag {tag}')
+
+
+# Raises on attribute assignment once an instance has finished initializing
+class Frozen:
+    def __setattr__(self, name, value):
+        if getattr(self, '_frozen', False):
+            raise AttributeError(f'{type(self).__name__} is frozen')
+        super().__setattr__(name, value)
+    
+    
+    def _freeze(self):
+        self._frozen = True
+
+
+class Settings(Frozen):
     def __init__(self):
         self.ENTRY_TYPE = 'Tong-its'
         self.CATALOG_SERVER = 'catalog.cse.nd.edu:9097'
@@ -32,20 +283,111 @@ class Settings:
         self.DELAY = 1
         self.MIN_CLIENTS = 2
         self.MAX_CLIENTS = 2
+        
+        # Strategy of the bots that fill empty seats, and seconds per bot decision
+        self.BOT_STRATEGY = 'heuristic'
+        self.BOT_BUDGET = 0.2
+        
+        # Seconds and deals the draw advisor may spend on an estimate
+        self.ADVISOR_BUDGET = 0.5
+        self.ADVISOR_SAMPLES = 2000
+        
+        # Wire codec preferred for lobby and game messages ('binary' or 'json'); JSON is always accepted
+        self.CODEC = 'binary'
+        
+        # Seconds a gamestate update may take to reach every seat; seats still receiving it are reported as slow
+        self.SEND_TIMEOUT = 2.0
+        
+        # Points a certain pick-up of your discard by the next player is worth avoiding
+        self.DISCARD_RISK_POINTS = 10
+        
+        # How much likelier the next player is to hold cards melding with a card that shares a set or run with the
+        # cards they picked up, or that fits their exposed melds (the melds they are building)
+        self.DISCARD_BUILDING_WEIGHT = 2.0
+        
+        # Overrides: a JSON file named by TONGITS_CONFIG, then TONGITS_<SETTING> environment variables
+        overrides = dict()
+        if 'TONGITS_CONFIG' in os.environ:
+            with open(os.environ['TONGITS_CONFIG']) as config_file:
+                overrides.update(json.load(config_file))
+        
+        for name in list(vars(self)):
+            if f'TONGITS_{name}' in os.environ:
+                overrides[name] = os.environ[f'TONGITS_{name}']
+        
+        for name in overrides:
+            if name not in vars(self):
+                raise KeyError(f'unknown setting {name!r}')
+            setattr(self, name, type(getattr(self, name))(overrides[name]))
+        
+        # Catalog address split once for registration
+        self.CATALOG_HOST, _, port = self.CATALOG_SERVER.rpartition(':')
+        self.CATALOG_PORT = int(port)
+        
+        self._freeze()
 
 
-class Constants:
+class Constants(Frozen):
     def __init__(self):
         self.NUM_PLAYERS        = 3
         self.STARTING_HAND_SIZE = 12
         
-        self.RANKS      = [
+        self.RANKS      = (
                             'A', '2', '3', '4', '5', '6', '7',
                             '8', '9', '10', 'J', 'Q', 'K'
-                          ]
+                          )
         
         self.CLUB       = '\U00002660'
         self.SPADE      = '\U00002663'
         self.HEART      = '\U00002665'
         self.DIAMOND    = '\U00002666'
-        self.SUITS      = [ self.CLUB, self.SPADE, self.HEART, self.DIAMOND ]
+        self.SUITS      = ( self.CLUB, self.SPADE, self.HEART, self.DIAMOND )
+        
+        # Lookup tables
+        self.RANK_INDEX = {rank: i for i, rank in enumerate(self.RANKS)}
+        self.SUIT_INDEX = {suit: i for i, suit in enumerate(self.SUITS)}
+        self.POINTS     = {rank: min(max(1, i), 10) for i, rank in enumerate(self.RANKS)}
+        
+        # Card ids (suit_index * 13 + rank_index)
+        self.CARD_IDS   = {(rank, suit): self.SUIT_INDEX[suit] * len(self.RANKS) + self.RANK_INDEX[rank] for rank in self.RANKS for suit in self.SUITS}
+        
+        # Display order of cards: by rank, then by suit symbol
+        self.CARD_ORDER = {card: i for i, card in enumerate(sorted(self.CARD_IDS, key=lambda card: (self.RANK_INDEX[card[0]], card[1])))}
+        
+        self._freeze()
+
+
+# Shared configuration, built once at import
+SETTINGS = Settings()
+CONSTANTS = Constants()
+
+# Codecs by name
+JSON = JsonCodec()
+BINARY = BinaryCodec(CONSTANTS.RANKS, CONSTANTS.SUITS)
+CODECS = {codec.name: codec for codec in (BINARY, JSON)}
+
+# Codec each connection sends with, keyed by its writer; connections that did not choose one send JSON
+_codecs = weakref.WeakKeyDictionary()
+
+
+# Returns the codec a connection sends with
+def get_codec(writer):
+    return _codecs.get(writer, JSON)
+
+
+# Sets the codec a connection sends with
+def set_codec(writer, name):
+    _codecs[writer] = CODECS[name]
+
+
+# Returns the codecs to offer when joining a lobby, preferred first
+def offered_codecs():
+    return [SETTINGS.CODEC] + [name for name in CODECS if name != SETTINGS.CODEC]
+
+
+# Returns the codec to use with a joining client: the first it offered that this side offers too
+def choose_codec(offered):
+    for name in offered:
+        if name in offered_codecs():
+            return name
+    return JSON.name
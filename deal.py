@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# deal.py
+
+# To prepare deals off the event loop
+import collections
+import concurrent.futures
+
+# Seeded fast PRNG for simulations, benchmarks and replays
+import random
+
+# CSPRNG for live games
+import secrets
+
+
+# In-place Fisher-Yates shuffle using any RNG with randrange()
+def shuffle(items, rng):
+    for i in range(len(items) - 1, 0, -1):
+        j = rng.randrange(i + 1)
+        items[i], items[j] = items[j], items[i]
+    
+    return items
+
+
+# Hands out one RNG per round. Without a seed every round uses the CSPRNG and records no seed; with a seed each
+# round gets its own recorded 64-bit seed, so any round can be replayed from it alone.
+class Dealer:
+    def __init__(self, seed=None):
+        self.seed = seed
+        self.round_seeds = list()
+        self._seeds = random.Random(seed) if seed != None else None
+    
+    
+    # Returns the RNG for the next round
+    def next_round(self):
+        if self._seeds == None:
+            self.round_seeds.append(None)
+            return secrets.SystemRandom()
+        
+        round_seed = self._seeds.getrandbits(64)
+        self.round_seeds.append(round_seed)
+        return random.Random(round_seed)
+    
+    
+    # Returns the seed of the latest round (None for CSPRNG rounds)
+    def last_seed(self):
+        return self.round_seeds[-1] if self.round_seeds else None
+
+
+# A small pool of rounds dealt ahead, in a background thread so a new round starts without waiting on the shuffle
+# or the deal. Each deal is (seed, rng, deal) where deal = make_deal(rng). close() (or leaving a with block) stops
+# the thread.
+class DealPool:
+    def __init__(self, dealer, make_deal, size=1):
+        self.dealer = dealer
+        self.make_deal = make_deal
+        self.size = size
+        
+        # One worker keeps the dealer's rounds (and their seeds) in order
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._deals = collections.deque()
+        
+        self.fill()
+    
+    
+    # Deal one round
+    def _deal(self):
+        rng = self.dealer.next_round()
+        return self.dealer.last_seed(), rng, self.make_deal(rng)
+    
+    
+    # Queue deals until the pool is full
+    def fill(self):
+        while len(self._deals) < self.size:
+            self._deals.append(self._executor.submit(self._deal))
+    
+    
+    # Returns the next deal (waiting for it only if it is not ready yet) and starts preparing a replacement
+    def take(self):
+        deal = self._deals.popleft().result()
+        self.fill()
+        return deal
+    
+    
+    # Stops the background thread, dropping the deals not taken
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._deals.clear()
+    
+    
+    def __enter__(self):
+        return self
+    
+    
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+# engine.py
+
+# To shuffle the deck of cards
+import secrets
+
+# O(n) Fisher-Yates shuffle over a pluggable RNG
+from deal import shuffle
+
+# To get game constants
+from config import CONSTANTS
+
+# Meld tables and the deadwood solver
+from melds import NUM_CARDS, MELD_INDEX, MELDS_BY_CARD, MELDS_BY_LOW, ACCEPTORS, outs, solve_deadwood
+
+# To convert to and from the host's game objects
+from server import CARDS, Meld
+
+# Winner values (same as tong-its.py)
+ONGOING = -1
+NOBODY = -2
+
+# Phases of a game
+PICK = 'pick'
+PLAY = 'play'
+RESPOND = 'respond'
+OVER = 'over'
+
+
+# Returns the ids of the cards in a mask, lowest first
+def cards_of(mask):
+    cards = list()
+    while mask:
+        cards.append((mask & -mask).bit_length() - 1)
+        mask &= mask - 1
+    return cards
+
+
+# Immutable game state; apply() returns a new state that shares everything it did not change. The deck is the
+# shuffled stock, shared by every state of a game; the cards deck[:cursor] are left, and the top card is deck[cursor-1].
+class GameState:
+    __slots__ = ('deck', 'cursor', 'discard', 'hands', 'melds', 'order', 'can_draw', 'last_draw', 'phase', 'sabotage', 'responses', 'winner', 'reason', 'turns')
+    
+    def __init__(self, deck, discard, hands, melds, order, can_draw, last_draw=None, phase=PICK, sabotage=False, responses=(), winner=ONGOING, reason=None, turns=0, cursor=None):
+        # Private
+        self.deck = deck
+        self.cursor = len(deck) if cursor == None else cursor
+        self.hands = hands
+        
+        # Public
+        self.discard = discard
+        self.melds = melds
+        self.order = order
+        self.can_draw = can_draw
+        self.last_draw = last_draw
+        self.phase = phase
+        self.sabotage = sabotage
+        
+        # (player_id, 'challenge' or 'fold') for each player that responded to a draw
+        self.responses = responses
+        
+        # winner is a player id once the game is over, or NOBODY if nobody exposed a meld before the deck ran out
+        # reason is 'out' (emptied hand), 'exhausted' or 'draw'
+        self.winner = winner
+        self.reason = reason
+        self.turns = turns
+    
+    
+    # Returns a shallow copy (every field is immutable, so the copy shares them all)
+    def clone(self):
+        state = GameState.__new__(GameState)
+        state.deck = self.deck
+        state.cursor = self.cursor
+        state.hands = self.hands
+        state.discard = self.discard
+        state.melds = self.melds
+        state.order = self.order
+        state.can_draw = self.can_draw
+        state.last_draw = self.last_draw
+        state.phase = self.phase
+        state.sabotage = self.sabotage
+        state.responses = self.responses
+        state.winner = self.winner
+        state.reason = self.reason
+        state.turns = self.turns
+        return state
+    
+    
+    # Returns a copy with some fields changed
+    def _replace(self, **changes):
+        state = self.clone()
+        for name in changes:
+            setattr(state, name, changes[name])
+        return state
+
+
+# Returns a tuple with one item changed
+def _set(items, index, value):
+    return items[:index] + (value,) + items[index+1:]
+
+
+# Returns a new game with a shuffled deck and 12 cards dealt to each player in turn order (rng defaults to the CSPRNG)
+def new_game(order=None, rng=None):
+    if rng == None:
+        rng = secrets.SystemRandom()
+    
+    if order == None:
+        order = shuffle(list(range(CONSTANTS.NUM_PLAYERS)), rng)
+    
+    deck = shuffle(list(range(NUM_CARDS)), rng)
+    
+    hands = [0] * CONSTANTS.NUM_PLAYERS
+    for _ in range(CONSTANTS.STARTING_HAND_SIZE):
+        for i in order:
+            hands[i] |= 1 << deck.pop()
+    
+    return GameState(tuple(deck), (), tuple(hands), tuple(() for _ in hands), tuple(order), tuple(False for _ in hands))
+
+
+# Returns the state of a game hosted by a Server (phase is how far the player on turn is into their turn)
+def from_server(server, phase=PICK):
+    hands = tuple(player.hand.mask for player in server.players)
+    melds = tuple(tuple(meld.mask for meld in player.melds) for player in server.players)
+    can_draw = tuple(player.can_draw for player in server.players)
+    
+    return GameState(tuple(card.id for card in server.deck), tuple(card.id for card in server.discard), hands, melds, tuple(server.order), can_draw, last_draw=server.last_draw, phase=phase)
+
+
+# Writes a state into a Server's deck, discard pile, order and players; hands and melds are synced so only the
+# cards that changed are tracked again
+def to_server(state, server):
+    server.deck = [CARDS[card] for card in state.deck[:state.cursor]]
+    server.discard = [CARDS[card] for card in state.discard]
+    server.order = list(state.order)
+    server.last_draw = state.last_draw
+    server.end = state.phase == OVER
+    
+    for i, player in enumerate(server.players):
+        player.hand.sync([CARDS[card] for card in cards_of(state.hands[i])])
+        player.melds = _sync_melds(player.melds, state.melds[i])
+        player.can_draw = state.can_draw[i]
+    
+    return server
+
+
+# Returns a player's Meld objects brought in line with their meld masks. A meld that only grew by cards it accepts
+# has them laid off in place (so its acceptors are updated, not recomputed), unchanged melds are kept, and any other
+# meld is built anew.
+def _sync_melds(melds, masks):
+    synced = list()
+    for meld_id, mask in enumerate(masks):
+        if meld_id < len(melds) and mask & melds[meld_id].mask == melds[meld_id].mask:
+            meld = melds[meld_id]
+            added = mask & ~meld.mask
+            while added & meld.accepts:
+                card = (added & meld.accepts & -(added & meld.accepts)).bit_length() - 1
+                meld.append(CARDS[card])
+                added &= ~(1 << card)
+            
+            if not added:
+                synced.append(meld)
+                continue
+        
+        synced.append(Meld([CARDS[card] for card in cards_of(mask)]))
+    
+    return synced
+
+
+# Returns the id of the player who must act next, or None if the game is over
+def to_move(state):
+    if state.phase == OVER:
+        return None
+    
+    if state.phase == RESPOND:
+        responded = [response[0] for response in state.responses]
+        for i in state.order[1:]:
+            if i not in responded:
+                return i
+    
+    return state.order[0]
+
+
+# Returns every legal action for the player to move
+def legal_actions(state):
+    player = to_move(state)
+    if player == None:
+        return list()
+    
+    hand = state.hands[player]
+    actions = list()
+    
+    if state.phase == PICK:
+        actions.append(('pick_deck',))
+        
+        # Pick up the discard only to expose a meld with it; the melds are only listed when the card is an out
+        if state.discard and outs(hand) >> state.discard[-1] & 1:
+            top = state.discard[-1]
+            for meld in MELDS_BY_CARD[top]:
+                rest = meld & ~(1 << top)
+                if rest & hand == rest:
+                    actions.append(('pick_discard', rest))
+        
+        if state.can_draw[player]:
+            actions.append(('draw',))
+    
+    elif state.phase == PLAY:
+        # Melds within the hand, in the order of MELDS
+        melds = [meld for card in cards_of(hand) for meld in MELDS_BY_LOW[card] if meld & hand == meld]
+        for meld in sorted(melds, key=MELD_INDEX.__getitem__):
+            actions.append(('expose', meld))
+        
+        for target, melds in enumerate(state.melds):
+            for meld_id, meld in enumerate(melds):
+                for card in cards_of(ACCEPTORS.get(meld, 0) & hand):
+                    actions.append(('lay_off', card, target, meld_id))
+        
+        for card in cards_of(hand):
+            actions.append(('discard', card))
+    
+    elif state.phase == RESPOND:
+        if state.melds[player]:
+            actions.append(('challenge',))
+        actions.append(('fold',))
+    
+    return actions
+
+
+# Returns the state after the player to move performs an action (the action is assumed to be legal)
+def apply(state, action):
+    player = to_move(state)
+    command = action[0]
+    
+    # Changes are made to a fresh clone before anyone else can see it
+    new = state.clone()
+    
+    if command == 'pick_deck':
+        new.cursor = state.cursor - 1
+        new.hands = _set(state.hands, player, state.hands[player] | 1 << state.deck[new.cursor])
+        new.last_draw = player
+        new.can_draw = _set(state.can_draw, player, False)
+        new.phase = PLAY
+        return new
+    
+    if command == 'pick_discard':
+        new.discard = state.discard[:-1]
+        new.hands = _set(state.hands, player, state.hands[player] & ~action[1])
+        new.melds = _set(state.melds, player, state.melds[player] + (action[1] | 1 << state.discard[-1],))
+        new.can_draw = _set(_set(state.can_draw, state.order[-1], False), player, False)
+        new.phase = PLAY
+        return _check_out(new, player)
+    
+    if command == 'draw':
+        new.phase = RESPOND
+        new.responses = ()
+        return new
+    
+    if command == 'expose':
+        new.hands = _set(state.hands, player, state.hands[player] & ~action[1])
+        new.melds = _set(state.melds, player, state.melds[player] + (action[1],))
+        new.can_draw = _set(state.can_draw, player, False)
+        return _check_out(new, player)
+    
+    if command == 'lay_off':
+        card, target, meld_id = action[1], action[2], action[3]
+        new.hands = _set(state.hands, player, state.hands[player] & ~(1 << card))
+        new.melds = _set(state.melds, target, _set(state.melds[target], meld_id, state.melds[target][meld_id] | 1 << card))
+        new.can_draw = _set(_set(state.can_draw, target, False), player, False)
+        new.sabotage = state.sabotage or target == player
+        return _check_out(new, player)
+    
+    if command == 'discard':
+        card = action[1]
+        new.hands = _set(state.hands, player, state.hands[player] & ~(1 << card))
+        new.discard = state.discard + (card,)
+        new.can_draw = _set(state.can_draw, player, bool(state.melds[player]) and not state.sabotage)
+        new.sabotage = False
+        
+        if not new.hands[player]:
+            new.phase, new.winner, new.reason = OVER, player, 'out'
+            return new
+        
+        # Deck exhausted
+        if not state.cursor:
+            points = {i: solve_deadwood(new.hands[i])[0] for i in range(len(new.hands)) if new.melds[i]}
+            new.phase, new.winner, new.reason = OVER, exhaustion_winner(points, new.last_draw, new.order), 'exhausted'
+            return new
+        
+        # End turn, and begin the next player's turn
+        new.order = state.order[1:] + state.order[:1]
+        new.phase = PICK
+        new.turns = state.turns + 1
+        return new
+    
+    if command == 'challenge' or command == 'fold':
+        new.responses = state.responses + ((player, command),)
+        if to_move(new) != new.order[0]:
+            return new
+        
+        # Everyone responded; the caller and the challengers compare hands
+        challengers = [new.order[0]] + [i for i, response in new.responses if response == 'challenge']
+        points = {i: solve_deadwood(new.hands[i])[0] for i in challengers}
+        new.phase, new.winner, new.reason = OVER, draw_winner(points, new.last_draw, new.order), 'draw'
+        return new
+    
+    raise ValueError(f'unknown action {action!r}')
+
+
+# Ends the game if the player emptied their hand (state is a fresh clone, so it is changed in place)
+def _check_out(state, player):
+    if not state.hands[player]:
+        state.phase, state.winner, state.reason = OVER, player, 'out'
+    return state
+
+
+# Returns the winner of an exhausted deck given the unmelded points of each player with an exposed meld
+def exhaustion_winner(points, last_draw, order):
+    if not points:
+        return NOBODY
+    
+    top_score = min(points.values())
+    top_candidates = [i for i in points if points[i] == top_score]
+    
+    # Break ties: the player who drew the last card, otherwise the player whose turn would have been next
+    if len(top_candidates) > 1:
+        if last_draw in top_candidates:
+            return last_draw
+        return order[1]
+    
+    return top_candidates[0]
+
+
+# Returns the winner of a called draw given the unmelded points of the caller and each challenger
+def draw_winner(points, last_draw, order):
+    top_score = min(points.values())
+    top_challengers = [i for i in points if points[i] == top_score]
+    
+    # The player who drew the last card loses every tie; otherwise the player whose turn would have been next wins
+    if len(top_challengers) > 1:
+        if last_draw in top_challengers:
+            top_challengers.remove(last_draw)
+        if len(top_challengers) > 1:
+            return order[1]
+    
+    return top_challengers[0]
@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+# env.py
+
+# To parse command line options
+import argparse
+
+# To time runs
+import time
+
+# To seed games and opponents
+import random
+
+# To step environments in worker processes
+import multiprocessing
+
+# Observations and action masks are arrays
+import numpy as np
+
+# To get game constants
+from config import CONSTANTS
+
+# The headless game engine
+import engine
+
+# Meld table and card numbering
+from melds import MELDS, MELD_INDEX, NUM_CARDS
+
+# Policies that play the other seats
+from policies import POLICIES
+
+# Indexes of the discrete actions: the four commands without arguments, a discard of each card, an expose of each
+# meld, a pick up of the discard completing each meld, and a lay-off of each card onto each seat (counted from the
+# agent in turn order; onto the first meld of that seat that accepts it)
+PICK_DECK = 0
+DRAW = 1
+CHALLENGE = 2
+FOLD = 3
+DISCARD = 4
+EXPOSE = DISCARD + NUM_CARDS
+PICK_DISCARD = EXPOSE + len(MELDS)
+LAY_OFF = PICK_DISCARD + len(MELDS)
+NUM_ACTIONS = LAY_OFF + NUM_CARDS * CONSTANTS.NUM_PLAYERS
+
+# Phases as observed; a finished game has its own
+PHASES = (engine.PICK, engine.PLAY, engine.RESPOND, engine.OVER)
+
+# Shapes of the observation arrays of one environment; seats are counted from the agent in turn order
+OBSERVATION_SHAPES = {
+    'hand'      : (NUM_CARDS,),
+    'discard'   : (NUM_CARDS,),
+    'top'       : (NUM_CARDS,),
+    'melds'     : (CONSTANTS.NUM_PLAYERS, NUM_CARDS),
+    'deck_size' : (),
+    'can_draw'  : (CONSTANTS.NUM_PLAYERS,),
+    'num_cards' : (CONSTANTS.NUM_PLAYERS,),
+    'phase'     : (len(PHASES),)
+}
+
+
+# Returns the index of an engine action taken by player
+def action_index(state, player, action):
+    command = action[0]
+    
+    if command == 'pick_deck':
+        return PICK_DECK
+    if command == 'draw':
+        return DRAW
+    if command == 'challenge':
+        return CHALLENGE
+    if command == 'fold':
+        return FOLD
+    if command == 'discard':
+        return DISCARD + action[1]
+    if command == 'expose':
+        return EXPOSE + MELD_INDEX[action[1]]
+    if command == 'pick_discard':
+        return PICK_DISCARD + MELD_INDEX[action[1] | 1 << state.discard[-1]]
+    if command == 'lay_off':
+        return LAY_OFF + action[1] * len(state.order) + seat_of(state, player, action[2])
+    
+    raise ValueError(f'unknown action {action!r}')
+
+
+# Returns how many turns after player's the other player's turn comes
+def seat_of(state, player, other):
+    return (state.order.index(other) - state.order.index(player)) % len(state.order)
+
+
+# Returns the observation arrays of a batch of rows (see TongitsEnv.row), unpacking every card mask at once
+def encode(rows):
+    masks = np.array([row[0] for row in rows], dtype='<u8')
+    cards = np.unpackbits(masks.view(np.uint8), axis=-1, bitorder='little').reshape(len(rows), -1, 64)[:, :, :NUM_CARDS]
+    counts = np.array([row[1] for row in rows], dtype=np.int8)
+    
+    num_players = CONSTANTS.NUM_PLAYERS
+    phase = np.zeros((len(rows), len(PHASES)), dtype=np.int8)
+    phase[np.arange(len(rows)), counts[:, -1]] = 1
+    
+    return {
+        'hand'      : cards[:, 0],
+        'discard'   : cards[:, 1],
+        'top'       : cards[:, 2],
+        'melds'     : cards[:, 3:3 + num_players],
+        'deck_size' : counts[:, 0],
+        'can_draw'  : counts[:, 1:1 + num_players],
+        'num_cards' : counts[:, 1 + num_players:1 + 2 * num_players],
+        'phase'     : phase
+    }
+
+
+# Returns the action masks of a batch of environments
+def encode_masks(envs):
+    masks = np.zeros((len(envs), NUM_ACTIONS), dtype=bool)
+    for i, env in enumerate(envs):
+        masks[i, list(env.actions)] = True
+    
+    return masks
+
+
+# One seat of a game against policies playing the other seats, Gymnasium style: reset() returns (observation, info)
+# and step() returns (observation, reward, terminated, truncated, info), with info['action_mask'] marking the legal
+# actions. The reward is 1 when the agent wins, -1 when another seat wins and 0 when nobody does.
+class TongitsEnv:
+    def __init__(self, opponents=('greedy', 'greedy'), seat=None, seed=None):
+        self.names = tuple(opponents)
+        self.rng = None
+        self.opponents = None
+        self._reseed(seed)
+        
+        # The agent's seat in the starting turn order, or None for a random seat each game
+        self.seat = seat
+        
+        self.state = None
+        self.player = None
+        self.policies = None
+        
+        # Legal actions of the agent by index
+        self.actions = dict()
+    
+    
+    # Deals a new game; seed reseeds the deals, the choice of seat and the opponents, so a seed replays an episode
+    def reset(self, seed=None, options=None):
+        if seed != None:
+            self._reseed(seed)
+        
+        self._deal()
+        return self._observe(), {'action_mask': encode_masks([self])[0]}
+    
+    
+    # Plays the agent's action (an index) and the other seats' actions until it is the agent's turn again or the
+    # game is over
+    def step(self, action):
+        reward, terminated = self._step(action)
+        return self._observe(), reward, terminated, False, {'action_mask': encode_masks([self])[0]}
+    
+    
+    # Seeds the deals and seats, and builds the opponents with seeds drawn from them
+    def _reseed(self, seed):
+        self.rng = random.Random(seed)
+        self.opponents = [POLICIES[name](random.Random(self.rng.getrandbits(64))) for name in self.names]
+    
+    
+    def _observe(self):
+        observation = encode([self.row()])
+        return {name: observation[name][0] for name in observation}
+    
+    
+    def _deal(self):
+        # Deal again in the rare game that ends before the agent moves
+        while True:
+            self.state = engine.new_game(rng=self.rng)
+            seat = self.seat if self.seat != None else self.rng.randrange(len(self.state.order))
+            self.player = self.state.order[seat]
+            
+            others = [player for player in self.state.order if player != self.player]
+            self.policies = dict(zip(others, self.opponents))
+            
+            if self._advance():
+                return
+    
+    
+    def _step(self, action):
+        if action not in self.actions:
+            raise ValueError(f'illegal action {action}')
+        
+        self.state = engine.apply(self.state, self.actions[action])
+        if self._advance():
+            return 0.0, False
+        
+        if self.state.winner == self.player:
+            return 1.0, True
+        return (0.0 if self.state.winner == engine.NOBODY else -1.0), True
+    
+    
+    # Plays the other seats until the agent is to move, and lists its legal actions; returns False if the game ended
+    def _advance(self):
+        state = self.state
+        player = engine.to_move(state)
+        while player != None and player != self.player:
+            state = engine.apply(state, self.policies[player].choose(state, player, engine.legal_actions(state)))
+            player = engine.to_move(state)
+        
+        self.state = state
+        self.actions = dict()
+        if player == None:
+            return False
+        
+        for action in engine.legal_actions(state):
+            self.actions.setdefault(action_index(state, player, action), action)
+        
+        return True
+    
+    
+    # Returns the card masks and counts the agent observes (see encode)
+    def row(self):
+        state = self.state
+        order = state.order
+        start = order.index(self.player)
+        seats = [order[(start + i) % len(order)] for i in range(len(order))]
+        
+        discard = 0
+        for card in state.discard:
+            discard |= 1 << card
+        top = 1 << state.discard[-1] if state.discard else 0
+        
+        melds = list()
+        for player in seats:
+            mask = 0
+            for meld in state.melds[player]:
+                mask |= meld
+            melds.append(mask)
+        
+        phase = PHASES.index(state.phase)
+        counts = [state.cursor] + [state.can_draw[player] for player in seats] + [state.hands[player].bit_count() for player in seats] + [phase]
+        
+        return [state.hands[self.player], discard, top] + melds, counts
+
+
+# Many environments stepped together: step() takes one action per environment and returns batched arrays.
+# An environment whose game ended is reset at once, so the observation returned for it is its next game's first;
+# as in Gymnasium's vector environments, the last observation of the ended game is in info['final_observation'] and
+# its info in info['final_info'] (both marked by info['_final_observation'] and info['_final_info']).
+class VectorEnv:
+    def __init__(self, num_envs, opponents=('greedy', 'greedy'), seat=None, seed=None):
+        rng = random.Random(seed)
+        self.envs = [TongitsEnv(opponents, seat, rng.getrandbits(64)) for _ in range(num_envs)]
+        self.num_envs = num_envs
+    
+    
+    def reset(self, seed=None, options=None):
+        if seed != None:
+            rng = random.Random(seed)
+            for env in self.envs:
+                env._reseed(rng.getrandbits(64))
+        
+        for env in self.envs:
+            env._deal()
+        
+        return encode([env.row() for env in self.envs]), {'action_mask': encode_masks(self.envs)}
+    
+    
+    def step(self, actions):
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+        terminated = np.zeros(self.num_envs, dtype=bool)
+        
+        final_rows = dict()
+        for i, env in enumerate(self.envs):
+            rewards[i], terminated[i] = env._step(int(actions[i]))
+            if terminated[i]:
+                final_rows[i] = env.row()
+                env._deal()
+        
+        observation = encode([env.row() for env in self.envs])
+        info = {'action_mask': encode_masks(self.envs)}
+        info.update(final_info(self.num_envs, final_rows))
+        
+        return observation, rewards, terminated, np.zeros(self.num_envs, dtype=bool), info
+    
+    
+    def close(self):
+        pass
+
+
+# Returns the info entries holding the last observation and info of the games that ended, {env index: row}
+def final_info(num_envs, final_rows):
+    ended = np.zeros(num_envs, dtype=bool)
+    observations = np.empty(num_envs, dtype=object)
+    infos = np.empty(num_envs, dtype=object)
+    
+    if final_rows:
+        arrays = encode(list(final_rows.values()))
+        for k, i in enumerate(final_rows):
+            ended[i] = True
+            observations[i] = {name: arrays[name][k] for name in arrays}
+            
+            # No action is legal once the game is over
+            infos[i] = {'action_mask': np.zeros(NUM_ACTIONS, dtype=bool)}
+    
+    return {'final_observation': observations, '_final_observation': ended, 'final_info': infos, '_final_info': ended.copy()}
+
+
+# Steps a VectorEnv in a worker process on commands from a pipe
+def _worker(connection, num_envs, opponents, seat, seed):
+    envs = VectorEnv(num_envs, opponents, seat, seed)
+    
+    while True:
+        command, data = connection.recv()
+        if command == 'reset':
+            connection.send(envs.reset(data))
+        elif command == 'step':
+            connection.send(envs.step(data))
+        else:
+            connection.close()
+            return
+
+
+# A VectorEnv split across worker processes, each stepping its share of the environments in parallel
+class SubprocVectorEnv:
+    def __init__(self, num_envs, workers=None, opponents=('greedy', 'greedy'), seat=None, seed=None):
+        workers = min(workers or multiprocessing.cpu_count(), num_envs)
+        rng = random.Random(seed)
+        
+        self.num_envs = num_envs
+        self.splits = [num_envs * i // workers for i in range(workers + 1)]
+        self.connections = list()
+        self.processes = list()
+        
+        for i in range(workers):
+            connection, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_worker, args=(child, self.splits[i + 1] - self.splits[i], opponents, seat, rng.getrandbits(64)), daemon=True)
+            process.start()
+            child.close()
+            
+            self.connections.append(connection)
+            self.processes.append(process)
+    
+    
+    def reset(self, seed=None, options=None):
+        rng = random.Random(seed)
+        for connection in self.connections:
+            connection.send(('reset', rng.getrandbits(64) if seed != None else None))
+        
+        results = [connection.recv() for connection in self.connections]
+        return self._concatenate([result[0] for result in results]), {'action_mask': np.concatenate([result[1]['action_mask'] for result in results])}
+    
+    
+    def step(self, actions):
+        for i, connection in enumerate(self.connections):
+            connection.send(('step', actions[self.splits[i]:self.splits[i + 1]]))
+        
+        results = [connection.recv() for connection in self.connections]
+        observation = self._concatenate([result[0] for result in results])
+        rewards, terminated, truncated = (np.concatenate([result[i] for result in results]) for i in (1, 2, 3))
+        
+        return observation, rewards, terminated, truncated, {key: np.concatenate([result[4][key] for result in results]) for key in results[0][4]}
+    
+    
+    def close(self):
+        for connection in self.connections:
+            connection.send(('close', None))
+        for process in self.processes:
+            process.join()
+    
+    
+    def _concatenate(self, observations):
+        return {name: np.concatenate([observation[name] for observation in observations]) for name in OBSERVATION_SHAPES}
+
+
+# Steps environments with uniformly random legal actions and returns the agent steps per second
+def benchmark(envs, steps, seed=None):
+    rng = np.random.default_rng(seed)
+    _, info = envs.reset(seed)
+    
+    start = time.perf_counter()
+    for _ in range(steps):
+        # Random legal action of each environment: the highest masked random score
+        scores = np.where(info['action_mask'], rng.random(info['action_mask'].shape), -1.0)
+        _, _, _, _, info = envs.step(scores.argmax(axis=1))
+    
+    return steps * envs.num_envs / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Tong-its environment with random agents')
+    parser.add_argument('-n', '--envs', type=int, default=64)
+    parser.add_argument('-j', '--workers', type=int, default=0, help='worker processes (0 to step in this process)')
+    parser.add_argument('-t', '--steps', type=int, default=200, help='steps of every environment')
+    parser.add_argument('-o', '--opponents', nargs=2, default=['greedy', 'greedy'], choices=sorted(POLICIES))
+    parser.add_argument('-s', '--seed', type=int, default=None)
+    args = parser.parse_args()
+    
+    envs = SubprocVectorEnv(args.envs, args.workers, args.opponents, seed=args.seed) if args.workers else VectorEnv(args.envs, args.opponents, seed=args.seed)
+    print(f'{benchmark(envs, args.steps, args.seed):,.0f} steps per second')
+    envs.close()
+
+
+if __name__ == '__main__':
+    main()
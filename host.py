@@ -20,7 +20,7 @@ import json
 import time
 
 # Predefined constants and helper functions
-from config import Settings, get_message, send_message
+from config import PROTOCOL_VERSION, SETTINGS, get_message, send_message, set_codec, choose_codec
 
 class Host:
     def __init__(self):
@@ -40,13 +40,13 @@ class Host:
     
     # Register with catalog server
     def register(self):
-        socket.socket(socket.AF_INET, socket.SOCK_DGRAM).sendto(str(json.dumps({'type': Settings().ENTRY_TYPE, 'owner': self.name, 'port': self.port, 'num_clients': len(self.clients)})).encode(), (Settings().CATALOG_SERVER[:-5], int(Settings().CATALOG_SERVER[-4:])))
+        socket.socket(socket.AF_INET, socket.SOCK_DGRAM).sendto(str(json.dumps({'type': SETTINGS.ENTRY_TYPE, 'owner': self.name, 'port': self.port, 'num_clients': len(self.clients)})).encode(), (SETTINGS.CATALOG_HOST, SETTINGS.CATALOG_PORT))
     
     
     # Register with catalog server every REGISTER_INTERVAL seconds
     async def register_coro(self):
         while not self.shutdown_flag.is_set():
-            await asyncio.sleep(Settings().REGISTER_INTERVAL)
+            await asyncio.sleep(SETTINGS.REGISTER_INTERVAL)
             self.register()
     
     
@@ -56,9 +56,19 @@ class Host:
         # Get join message
         message = await get_message(reader)
         
+        # Refuse clients that speak another version of the game protocol (older clients send none)
+        if message.get('protocol') != PROTOCOL_VERSION:
+            await send_message(writer, {'command': 'join', 'status': 'failure', 'reason': 'protocol', 'protocol': PROTOCOL_VERSION})
+            
+            # Close connection
+            writer.close()
+            await writer.wait_closed()
+            
+            return
+        
         # Check if lobby is not full
         async with self.clients_lock:
-            if not (full := len(self.clients) == Settings().MAX_CLIENTS):
+            if not (full := len(self.clients) == SETTINGS.MAX_CLIENTS):
                 # Accept new client
                 join_time = time.time_ns() / 1000000000.0
                 self.clients[(reader, writer)] = {
@@ -82,11 +92,16 @@ class Host:
             
             return
         
-        # Send acceptance response
-        if (await send_message(writer, {'command': 'join', 'status': 'success'}) == 0):
+        # Send acceptance response with the codec chosen from those the client offered (clients that offer none read
+        # JSON), and the protocol version so the client can check it too
+        codec = choose_codec(message.get('codecs', ()))
+        if (await send_message(writer, {'command': 'join', 'status': 'success', 'codec': codec, 'protocol': PROTOCOL_VERSION}) == 0):
             # Trigger shutdown on this client handle
             self.clients[(reader, writer)]['shutdown'].set()
         
+        # Send everything else in the chosen codec
+        set_codec(writer, codec)
+        
         # Set refresh_flag event to get lobbies
         self.refresh_flag.set()
         
@@ -165,8 +180,8 @@ class Host:
         while not self.shutdown_flag.is_set():
             
             # Wait for PING_INTERVAL seconds
-            await asyncio.sleep(Settings().PING_INTERVAL)
-            stale_time = time.time_ns() / 1000000000.0 - (Settings().PING_INTERVAL + Settings().DELAY)
+            await asyncio.sleep(SETTINGS.PING_INTERVAL)
+            stale_time = time.time_ns() / 1000000000.0 - (SETTINGS.PING_INTERVAL + SETTINGS.DELAY)
             
             async with self.clients_lock:
                 # Record the starting number of clients before the purge
@@ -230,4 +245,4 @@ class Host:
         self.clients_lock.release()
         
         # Register a lie to make lobby disappear
-        socket.socket(socket.AF_INET, socket.SOCK_DGRAM).sendto(str(json.dumps({'type': Settings().ENTRY_TYPE, 'owner': self.name, 'port': self.port, 'num_clients': Settings().MAX_CLIENTS + 1})).encode(), (Settings().CATALOG_SERVER[:-5], int(Settings().CATALOG_SERVER[-4:])))
+        socket.socket(socket.AF_INET, socket.SOCK_DGRAM).sendto(str(json.dumps({'type': SETTINGS.ENTRY_TYPE, 'owner': self.name, 'port': self.port, 'num_clients': SETTINGS.MAX_CLIENTS + 1})).encode(), (SETTINGS.CATALOG_HOST, SETTINGS.CATALOG_PORT))
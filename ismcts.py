@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# ismcts.py
+
+# To weigh exploration against exploitation
+import math
+
+# To seed searches
+import random
+
+# To stop searching at the deadline
+import time
+
+# The headless game engine
+from engine import OVER, PICK, RESPOND, apply, cards_of, legal_actions, new_game, to_move
+
+# To shuffle the unseen cards
+from deal import shuffle
+
+# Meld tables and the deadwood solver
+from melds import ACCEPTORS, MELDS_BY_CARD, NUM_CARDS, POINTS, solve_deadwood
+
+ALL_CARDS = (1 << NUM_CARDS) - 1
+
+
+# Returns the mask of cards a seat has seen: its own hand, the discard pile and every exposed meld
+def seen_mask(state, player):
+    seen = state.hands[player]
+    for card in state.discard:
+        seen |= 1 << card
+    for melds in state.melds:
+        for meld in melds:
+            seen |= meld
+    
+    return seen
+
+
+# Returns a full game state consistent with a seat's view: the unseen cards dealt at random to the other hands
+# (as many as each holds) and the deck
+def determinize(view, rng):
+    state = view.state
+    unseen = view.tracker.unseen if view.tracker != None else ALL_CARDS & ~seen_mask(state, view.player)
+    unseen = shuffle(cards_of(unseen), rng)
+    
+    hands = list(state.hands)
+    for i in range(len(hands)):
+        if i != view.player:
+            hands[i] = 0
+            for _ in range(view.num_cards[i]):
+                hands[i] |= 1 << unseen.pop()
+    
+    return state._replace(deck=tuple(unseen), cursor=len(unseen), hands=tuple(hands))
+
+
+# Returns a quick greedy action for rollouts: call or challenge draws on low hands, pick up the discard when it
+# melds, expose the melds of the best partition of the hand, lay off anything, then discard the highest card
+def rollout_action(state, draw_threshold=10):
+    player = to_move(state)
+    hand = state.hands[player]
+    
+    if state.phase == RESPOND:
+        if state.melds[player] and solve_deadwood(hand)[0] <= draw_threshold:
+            return ('challenge',)
+        return ('fold',)
+    
+    if state.phase == PICK:
+        if state.can_draw[player] and solve_deadwood(hand)[0] <= draw_threshold:
+            return ('draw',)
+        
+        if state.discard:
+            top = state.discard[-1]
+            for meld in MELDS_BY_CARD[top]:
+                rest = meld & ~(1 << top)
+                if rest & hand == rest:
+                    return ('pick_discard', rest)
+        
+        return ('pick_deck',)
+    
+    melds = solve_deadwood(hand)[1]
+    if melds:
+        return ('expose', melds[0])
+    
+    for target, target_melds in enumerate(state.melds):
+        for meld_id, meld in enumerate(target_melds):
+            accepts = ACCEPTORS.get(meld, 0) & hand
+            if accepts:
+                return ('lay_off', (accepts & -accepts).bit_length() - 1, target, meld_id)
+    
+    return ('discard', max(cards_of(hand), key=POINTS.__getitem__))
+
+
+# A node of the search tree, reached by an action of player
+class Node:
+    __slots__ = ('action', 'player', 'parent', 'children', 'visits', 'wins', 'available')
+    
+    def __init__(self, action=None, player=None, parent=None):
+        self.action = action
+        self.player = player
+        self.parent = parent
+        self.children = dict()
+        
+        # Playouts through the node, how many player won, and how many times the node could have been chosen
+        self.visits = 0
+        self.wins = 0
+        self.available = 0
+    
+    
+    # Returns the upper confidence bound of the node
+    def ucb(self, exploration):
+        return self.wins / self.visits + exploration * math.sqrt(math.log(self.available) / self.visits)
+
+
+# Single-observer information set MCTS from a seat's view. Every iteration deals the unseen cards anew and only
+# follows the actions legal in that deal. Runs until seconds pass, the deadline (a time.monotonic() time, which
+# worker processes share) passes or iterations are done (whichever comes first), and returns {action: (visits, wins)}
+# for the seat's actions at the root. A search that starts after its deadline returns at once.
+def search(view, seconds=None, iterations=None, seed=None, exploration=0.7, deadline=None):
+    if seconds == None and iterations == None and deadline == None:
+        raise ValueError('search needs a time or an iteration budget')
+    
+    rng = random.Random(seed)
+    if seconds != None:
+        deadline = min(deadline, time.monotonic() + seconds) if deadline != None else time.monotonic() + seconds
+    root = Node()
+    
+    done = 0
+    while (iterations == None or done < iterations) and (deadline == None or time.monotonic() < deadline):
+        done += 1
+        state = determinize(view, rng)
+        node = root
+        
+        # Select legal children by UCB until a node has untried actions, then expand one of them
+        while state.phase != OVER:
+            actions = legal_actions(state)
+            untried = [action for action in actions if action not in node.children]
+            
+            legal = [node.children[action] for action in actions if action in node.children]
+            for child in legal:
+                child.available += 1
+            
+            if untried:
+                action = untried[rng.randrange(len(untried))]
+                child = Node(action, to_move(state), node)
+                child.available += 1
+                node.children[action] = child
+                node = child
+                state = apply(state, action)
+                break
+            
+            node = max(legal, key=lambda child: child.ucb(exploration))
+            state = apply(state, node.action)
+        
+        # Play out the rest of the game greedily
+        while state.phase != OVER:
+            state = apply(state, rollout_action(state))
+        
+        # Credit the win to the player whose action led to each node
+        while node != None:
+            node.visits += 1
+            if node.player == state.winner:
+                node.wins += 1
+            node = node.parent
+    
+    return {action: (child.visits, child.wins) for action, child in root.children.items()}
+
+
+# Starts a worker process off: its modules are loaded and its meld caches filled by a few playouts, so its first
+# search spends its budget searching
+def warm_up(playouts=8):
+    rng = random.Random()
+    for _ in range(playouts):
+        state = new_game(rng=rng)
+        while state.phase != OVER:
+            state = apply(state, rollout_action(state))
@@ -23,7 +23,7 @@ import json
 import time
 
 # Predefined constants and helper functions
-from config import Settings, get_message, send_message
+from config import PROTOCOL_VERSION, SETTINGS, get_message, send_message, set_codec, offered_codecs
 
 # Host
 from host import Host
@@ -159,7 +159,7 @@ async def displayHost(state_info):
     # Display options
     state_info.stdscr.addstr('r: refresh\n')
     state_info.stdscr.addstr('d: disband\n')
-    state_info.stdscr.addstr('s: start\n')
+    state_info.stdscr.addstr('s: start (bots fill empty seats)\n')
     state_info.stdscr.addstr('q: quit\n')
     
     # Display prompt
@@ -262,7 +262,7 @@ async def displayJoin(state_info):
         return
     
     # Check client names
-    async with asyncio.timeout(Settings().DELAY):
+    async with asyncio.timeout(SETTINGS.DELAY):
         try:
             while state_info.handle.client_names == None:
                 await asyncio.sleep(0)
@@ -333,7 +333,7 @@ async def menuState(state_info):
         state_info.handle = Host()
         
         # Create server object
-        state_info.handle.server = await asyncio.start_server(state_info.handle.handle_client, host=socket.gethostname(), backlog=Settings().MAX_CLIENTS)
+        state_info.handle.server = await asyncio.start_server(state_info.handle.handle_client, host=socket.gethostname(), backlog=SETTINGS.MAX_CLIENTS)
         
         # Save port for registration and shutdown
         state_info.handle.port = state_info.handle.server.sockets[0].getsockname()[1]
@@ -375,7 +375,7 @@ async def menuState(state_info):
         return state_info
     
     # Send name to host
-    if (await send_message(state_info.handle.writer, {'command': 'join', 'name': state_info.name}) == 0):
+    if (await send_message(state_info.handle.writer, {'command': 'join', 'name': state_info.name, 'protocol': PROTOCOL_VERSION, 'codecs': offered_codecs()}) == 0):
         # Error joining lobby
         await state_info.handle.shutdown()
         state_info.handle = None
@@ -389,8 +389,11 @@ async def menuState(state_info):
     # Get response
     response = await get_message(state_info.handle.reader)
     
-    # Parse response
-    if response['status'] == 'success':
+    # Parse response (leaving hosts that speak another version of the game protocol, or none, as older hosts do)
+    if response['status'] == 'success' and response.get('protocol') == PROTOCOL_VERSION:
+        
+        # Send in the codec the host chose (hosts that do not choose one read JSON)
+        set_codec(state_info.handle.writer, response.get('codec', 'json'))
         
         # Listen to host for refresh requests or kicks
         state_info.handle.listen_task = asyncio.create_task(state_info.handle.listen_coro())
@@ -402,6 +405,10 @@ async def menuState(state_info):
         
         return state_info
     
+    # Leave a host that let you in but speaks another protocol
+    if response['status'] == 'success':
+        await send_message(state_info.handle.writer, {'command': 'leave'})
+    
     # Error joining lobby
     await state_info.handle.shutdown()
     state_info.handle = None
@@ -496,7 +503,7 @@ class StateInfo:
     async def get_lobbies(self):
         # Try to get catalog within time limit
         try:
-            async with asyncio.timeout(Settings().DELAY):
+            async with asyncio.timeout(SETTINGS.DELAY):
                 response = await self._get_catalog()
         
         except TimeoutError:
@@ -508,7 +515,7 @@ class StateInfo:
     
     
     async def _get_catalog(self):
-        http_conn = http.client.HTTPConnection(Settings().CATALOG_SERVER)
+        http_conn = http.client.HTTPConnection(SETTINGS.CATALOG_SERVER)
         http_conn.request('GET', '/query.json')
         response = http_conn.getresponse()
         http_conn.close()
@@ -526,7 +533,7 @@ class StateInfo:
             if all(key in entry for key in ('type', 'lastheardfrom', 'num_clients', 'address', 'port', 'owner')):
                 
                 # If the entry is an open lobby (correct type, not stale, not full)
-                if entry['type'] == Settings().ENTRY_TYPE and entry['lastheardfrom'] >= time.time_ns() / 1000000000.0 - Settings().REGISTER_INTERVAL - Settings().DELAY and entry['num_clients'] < Settings().MAX_CLIENTS:
+                if entry['type'] == SETTINGS.ENTRY_TYPE and entry['lastheardfrom'] >= time.time_ns() / 1000000000.0 - SETTINGS.REGISTER_INTERVAL - SETTINGS.DELAY and entry['num_clients'] < SETTINGS.MAX_CLIENTS:
                     
                     # Ensure entry is most recent entry of its kind
                     most_recent = True
@@ -549,9 +556,9 @@ class StateInfo:
     def display_lobbies(self, indexed=False):
         for i, lobby in enumerate(self.lobbies, start=1):
             if indexed:
-                self.stdscr.addstr(f'{i}: {lobby["owner"]} - {lobby["address"]}:{lobby["port"]} [{lobby["num_clients"]}/{Settings().MAX_CLIENTS}]\n')
+                self.stdscr.addstr(f'{i}: {lobby["owner"]} - {lobby["address"]}:{lobby["port"]} [{lobby["num_clients"]}/{SETTINGS.MAX_CLIENTS}]\n')
             else:
-                self.stdscr.addstr(f'{lobby["owner"]} - {lobby["address"]}:{lobby["port"]} [{lobby["num_clients"]}/{Settings().MAX_CLIENTS}]\n')
+                self.stdscr.addstr(f'{lobby["owner"]} - {lobby["address"]}:{lobby["port"]} [{lobby["num_clients"]}/{SETTINGS.MAX_CLIENTS}]\n')
 
 
 async def start_lobby(stdscr):
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# melds.py
+
+# To cache deadwood solutions
+import functools
+
+# To get game constants
+from config import CONSTANTS
+
+NUM_RANKS = len(CONSTANTS.RANKS)
+NUM_SUITS = len(CONSTANTS.SUITS)
+NUM_CARDS = NUM_RANKS * NUM_SUITS
+
+# Maps (rank, suit) to card id (same numbering as server.CARDS: suit_index * 13 + rank_index)
+CARD_IDS = CONSTANTS.CARD_IDS
+
+
+# Point value of each card id
+POINTS = tuple(CONSTANTS.POINTS[CONSTANTS.RANKS[card % NUM_RANKS]] for card in range(NUM_CARDS))
+
+# Returns the id of a card given either a server.Card, a decomposed [rank, suit] pair or an id
+def card_index(card):
+    if type(card) is int:
+        return card
+    if hasattr(card, 'id'):
+        return card.id
+    return CARD_IDS[(card[0], card[1])]
+
+
+# Returns a 52-bit mask of cards (read off a HandState or Meld, which keep theirs)
+def hand_mask(cards):
+    if hasattr(cards, 'mask'):
+        return cards.mask
+    
+    mask = 0
+    for card in cards:
+        mask |= 1 << card_index(card)
+    return mask
+
+
+# Returns every 3 and 4-of-a-kind
+def _init_sets():
+    sets = list()
+    for rank in range(NUM_RANKS):
+        rank_mask = sum(1 << (suit * NUM_RANKS + rank) for suit in range(NUM_SUITS))
+        
+        # 4-of-a-kind
+        sets.append(rank_mask)
+        
+        # 3-of-a-kind (leave one suit out)
+        for suit in range(NUM_SUITS):
+            sets.append(rank_mask & ~(1 << (suit * NUM_RANKS + rank)))
+    
+    return sets
+
+
+# Returns every 3 to 13 card same-suit run
+def _init_runs():
+    runs = list()
+    for suit in range(NUM_SUITS):
+        for length in range(3, NUM_RANKS + 1):
+            for low in range(NUM_RANKS - length + 1):
+                runs.append(((1 << length) - 1) << (suit * NUM_RANKS + low))
+    
+    return runs
+
+
+# Every legal meld as a bitmask
+SETS = tuple(_init_sets())
+RUNS = tuple(_init_runs())
+MELDS = SETS + RUNS
+MELD_MASKS = frozenset(MELDS)
+
+# Position of each meld in MELDS
+MELD_INDEX = {meld: i for i, meld in enumerate(MELDS)}
+
+# Cards that can be laid off on each meld (the missing rank-mates of a set, the cards at either end of a run)
+ACCEPTORS = {meld: sum(1 << card for card in range(NUM_CARDS) if not meld >> card & 1 and meld | 1 << card in MELD_MASKS) for meld in MELDS}
+
+# Melds containing each card
+MELDS_BY_CARD = tuple(tuple(meld for meld in MELDS if meld >> card & 1) for card in range(NUM_CARDS))
+
+# Bits of a suit's row of ranks, the lowest bit of every row, and the cards a run can start at (up to the Jack)
+ROW = (1 << NUM_RANKS) - 1
+SUIT_SPREAD = sum(1 << (suit * NUM_RANKS) for suit in range(NUM_SUITS))
+RUN_STARTS = ((1 << (NUM_RANKS - 2)) - 1) * SUIT_SPREAD
+
+# Points of every combination of ranks in a row
+ROW_POINTS = tuple(sum(POINTS[rank] for rank in range(NUM_RANKS) if row >> rank & 1) for row in range(1 << NUM_RANKS))
+
+# Melds whose lowest card is each card, so the melds within a hand are found from its cards alone
+MELDS_BY_LOW = tuple(tuple(meld for meld in MELDS if meld & -meld == 1 << card) for card in range(NUM_CARDS))
+
+# Every 3-card meld; any larger meld contains one of these, so they suffice to test for a meld's existence
+MELDS_3 = tuple(meld for meld in MELDS if meld.bit_count() == 3)
+
+# 3-card melds containing each card
+MELDS_3_BY_CARD = tuple(tuple(meld for meld in MELDS_3 if meld >> card & 1) for card in range(NUM_CARDS))
+
+
+# Returns the cards of a hand mask that are in at least one meld within the hand, testing every card at once
+def meldable(mask):
+    # Cards in a run: the first card of every held 3-card run window, spread over the window
+    starts = mask & mask >> 1 & mask >> 2 & RUN_STARTS
+    runs = starts | starts << 1 | starts << 2
+    
+    # Cards in a set: ranks held in 3 or more suits, counted a suit row at a time
+    ones = twos = threes = 0
+    for suit in range(NUM_SUITS):
+        row = mask >> (suit * NUM_RANKS) & ROW
+        threes |= twos & row
+        twos |= ones & row
+        ones |= row
+    
+    return (runs | threes * SUIT_SPREAD) & mask
+
+
+# Returns the cards that would complete a 3-card meld with two cards of a hand mask, testing every card at once.
+# Every larger meld holds a 3-card meld with any one of its cards, so these are exactly the cards that can be
+# picked up from the discard.
+def outs(mask):
+    runs = 0
+    ones = twos = 0
+    for suit in range(NUM_SUITS):
+        row = mask >> (suit * NUM_RANKS) & ROW
+        
+        # Two cards in a row complete a run at either end, and two cards one apart complete it in the gap
+        pairs = row & row >> 1
+        gaps = row & row >> 2
+        runs |= ((pairs >> 1 | pairs << 2 | gaps << 1) & ROW) << (suit * NUM_RANKS)
+        
+        # Ranks held in 2 or more suits
+        twos |= ones & row
+        ones |= row
+    
+    return (runs | twos * SUIT_SPREAD) & ~mask
+
+
+# Returns the minimum unmelded points of a hand mask and the non-overlapping melds (as masks) that achieve it
+def solve_deadwood(mask):
+    # Cards that meld with nothing else in the hand are always unmelded; only the rest need searching
+    live = meldable(mask)
+    dead = mask & ~live
+    
+    points = 0
+    for suit in range(NUM_SUITS):
+        points += ROW_POINTS[dead >> (suit * NUM_RANKS) & ROW]
+    
+    if not live:
+        return points, ()
+    
+    live_points, melds = _solve_live(live)
+    return live_points + points, melds
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def _solve_live(mask):
+    if not mask:
+        return 0, ()
+    
+    # The lowest card is either left unmelded or used by one of the melds containing it
+    card = (mask & -mask).bit_length() - 1
+    
+    best_points, best_melds = _solve_live(mask & ~(1 << card))
+    best_points += POINTS[card]
+    
+    for meld in MELDS_BY_CARD[card]:
+        if meld & mask == meld:
+            points, melds = _solve_live(mask & ~meld)
+            if points < best_points:
+                best_points, best_melds = points, (meld,) + melds
+    
+    return best_points, best_melds
+
+
+# A hand of cards that keeps its mask up to date as cards are added and removed, so the engine and the trackers
+# read it without going over the cards
+class HandState(list):
+    def __init__(self, cards=()):
+        super().__init__()
+        
+        self.mask = 0
+        
+        self.extend(cards)
+    
+    
+    # Rebuild from the cards when copied or pickled so the mask is not counted twice
+    def __reduce__(self):
+        return (HandState, (list(self),))
+    
+    
+    def append(self, card):
+        super().append(card)
+        self.mask |= 1 << card_index(card)
+    
+    
+    def extend(self, cards):
+        for card in cards:
+            self.append(card)
+    
+    
+    def insert(self, i, card):
+        super().insert(i, card)
+        self.mask |= 1 << card_index(card)
+    
+    
+    def remove(self, card):
+        super().remove(card)
+        self.mask &= ~(1 << card_index(card))
+    
+    
+    def pop(self, i=-1):
+        card = super().pop(i)
+        self.mask &= ~(1 << card_index(card))
+        return card
+    
+    
+    def clear(self):
+        self.sync(())
+    
+    
+    # Replace the hand's cards, keeping the cards it still holds in their order and adding the new ones at its end,
+    # so a hand streamed to a client changes by the cards that came and went
+    def sync(self, cards):
+        mask = hand_mask(cards)
+        kept = [card for card in self if mask >> card_index(card) & 1]
+        added = [card for card in cards if not self.mask >> card_index(card) & 1]
+        super().__setitem__(slice(None), kept + added)
+        self.mask = mask
+        
+        return self
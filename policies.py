@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# policies.py
+
+# To pick random actions
+import random
+
+# To declare what every policy implements
+import abc
+
+# Meld tables and the deadwood solver
+from melds import POINTS, solve_deadwood
+
+
+# Picks an action for the player to move given the legal actions
+class Policy(abc.ABC):
+    name = 'policy'
+    
+    def __init__(self, rng=None):
+        self.rng = rng if rng != None else random.Random()
+    
+    
+    @abc.abstractmethod
+    def choose(self, state, player, actions):
+        pass
+
+
+# Picks uniformly among the legal actions
+class RandomPolicy(Policy):
+    name = 'random'
+    
+    def choose(self, state, player, actions):
+        return self.rng.choice(actions)
+
+
+# Melds whenever it can, lays off whatever it can, discards the card that leaves the least deadwood and calls or
+# challenges draws when its deadwood is at most draw_threshold
+class GreedyPolicy(Policy):
+    name = 'greedy'
+    
+    def __init__(self, rng=None, draw_threshold=10):
+        super().__init__(rng)
+        self.draw_threshold = draw_threshold
+    
+    
+    def choose(self, state, player, actions):
+        hand = state.hands[player]
+        by_command = dict()
+        for action in actions:
+            by_command.setdefault(action[0], list()).append(action)
+        
+        # Respond to a draw
+        if 'fold' in by_command:
+            if 'challenge' in by_command and solve_deadwood(hand)[0] <= self.draw_threshold:
+                return by_command['challenge'][0]
+            return by_command['fold'][0]
+        
+        # Start of turn
+        if 'pick_deck' in by_command:
+            if 'draw' in by_command and solve_deadwood(hand)[0] <= self.draw_threshold:
+                return by_command['draw'][0]
+            if 'pick_discard' in by_command:
+                return max(by_command['pick_discard'], key=lambda action: action[1].bit_count())
+            return by_command['pick_deck'][0]
+        
+        # Expose the melds of the best partition of the hand
+        if 'expose' in by_command:
+            melds = solve_deadwood(hand)[1]
+            if melds:
+                return ('expose', melds[0])
+        
+        if 'lay_off' in by_command:
+            return by_command['lay_off'][0]
+        
+        # Discard the card that leaves the least deadwood, the highest card on ties
+        return min(by_command['discard'], key=lambda action: (solve_deadwood(hand & ~(1 << action[1]))[0], -POINTS[action[1]]))
+
+
+# Policies by name
+POLICIES = {policy.name: policy for policy in (RandomPolicy, GreedyPolicy)}
@@ -5,16 +5,34 @@
 import os
 
 # To shuffle the deck of cards
-import secrets
+from deal import Dealer, DealPool, shuffle
 
 # To get game constants
-from config import Constants
+from config import CONSTANTS
+
+# To track which cards an exposed meld accepts and what a hand can meld
+from melds import ACCEPTORS, HandState, hand_mask
 
 class Card:
-    def __init__(self, rank, suit):
+    __slots__ = ('id', 'rank', 'suit', 'rank_index', 'suit_index', 'points')
+    
+    def __init__(self, card_id, rank, suit):
+        self.id = card_id
         self.rank = rank
         self.suit = suit
-        self.points = min(max(1, Constants().RANKS.index(self.rank)), 10)
+        self.rank_index = CONSTANTS.RANK_INDEX[rank]
+        self.suit_index = CONSTANTS.SUIT_INDEX[suit]
+        self.points = CONSTANTS.POINTS[rank]
+    
+    def __repr__(self):
+        return f'{self.rank}{self.suit}'
+
+
+# Canonical 52-card registry; every card in play is one of these interned objects (id = suit_index * 13 + rank_index)
+CARDS = tuple(Card(suit_index * len(CONSTANTS.RANKS) + rank_index, rank, suit) for suit_index, suit in enumerate(CONSTANTS.SUITS) for rank_index, rank in enumerate(CONSTANTS.RANKS))
+
+# Maps (rank, suit) to its interned card
+CARD_LOOKUP = {(card.rank, card.suit): card for card in CARDS}
 
 # Decomposes cards
 def decompose(cards):
@@ -22,13 +40,27 @@ def decompose(cards):
 
 # Composes cards
 def compose(cards):
-    return [Card(card[0], card[1]) for card in cards]
+    return [CARD_LOOKUP[(card[0], card[1])] for card in cards]
+
+
+class Meld(list):
+    def __init__(self, cards):
+        super().__init__(cards)
+        self.mask = hand_mask(self)
+        self.accepts = ACCEPTORS.get(self.mask, 0)
+    
+    
+    # Lay off a card and update the cards this meld accepts
+    def append(self, card):
+        super().append(card)
+        self.mask |= 1 << card.id
+        self.accepts = ACCEPTORS.get(self.mask, 0)
 
 
 class Player:
     def __init__(self, name, score=0):
         # Private
-        self.hand = list()
+        self.hand = HandState()
         
         # Public
         self.name = name
@@ -38,14 +70,16 @@ class Player:
 
 
 class Server:
-    def __init__(self, clients):
+    def __init__(self, clients, seed=None):
         # Private
-        self.deck = self._init_deck()
+        self.dealer = Dealer(seed)
+        self.deals = DealPool(self.dealer, self._init_deal)
+        self.seed, self.rng, (self.deck, hands) = self.deals.take()
         
         # Public
         self.order = self._init_order()
         # Mixed
-        self.players = self._init_players([(None, None, os.getlogin())]+clients)
+        self.players = self._init_players([(None, None, os.getlogin())]+clients, hands)
         
         # Public
         self.discard = list()
@@ -56,46 +90,43 @@ class Server:
         #self.turn = None
     
     
-    # Returns a standard 52-card shuffled deck
-    def _init_deck(self):
-        temp_deck = [Card(rank, suit) for rank in Constants().RANKS for suit in Constants().SUITS]
-        deck = list()
-        while temp_deck:
-            card = secrets.choice(temp_deck)
-            deck.append(card)
-            temp_deck.remove(card)
+    # Returns a standard 52-card shuffled deck, and the hands dealt from it to each position in turn order
+    # (built in the deal pool's thread, so a round starts with its hands already tracked)
+    def _init_deal(self, rng):
+        deck = shuffle(list(CARDS), rng)
+        hands = [HandState() for _ in range(CONSTANTS.NUM_PLAYERS)]
+        for _ in range(CONSTANTS.STARTING_HAND_SIZE):
+            for hand in hands:
+                hand.append(deck.pop())
         
-        return deck
+        return deck, hands
     
     
     # Returns a random order of player indices
     def _init_order(self):
-        temp_order = [i for i in range(Constants().NUM_PLAYERS)]
-        order = list()
-        while temp_order:
-            index = secrets.choice(temp_order)
-            order.append(index)
-            temp_order.remove(index)
-        
-        return order
+        return shuffle([i for i in range(CONSTANTS.NUM_PLAYERS)], self.rng)
     
     
-    # Deal cards to players
-    def _init_players(self, clients, scores=[0 for _ in range(Constants().NUM_PLAYERS)]):
-        players = [Player(clients[i][2], scores[i]) for i in range(Constants().NUM_PLAYERS)]
-        for _ in range(Constants().STARTING_HAND_SIZE):
-            for i in self.order:
-                players[i].hand.append(self.deck.pop())
+    # Seat players with the hands dealt to their positions in turn order
+    def _init_players(self, clients, hands, scores=[0 for _ in range(CONSTANTS.NUM_PLAYERS)]):
+        players = [Player(clients[i][2], scores[i]) for i in range(CONSTANTS.NUM_PLAYERS)]
+        for position, i in enumerate(self.order):
+            players[i].hand = hands[position]
         
         return players
     
     
-    # Reset the game
+    # Reset the game with the round prepared in the background
     def reset(self, clients, winner):
-        self.deck = self._init_deck()
+        self.seed, self.rng, (self.deck, hands) = self.deals.take()
         self.discard = list()
-        self.players = self._init_players([(None, None, os.getlogin())]+clients, [player.score for player in self.players])
-        self.last_draw = None
         self.order = self.order[self.order.index(winner):] + self.order[:self.order.index(winner)]
+        self.players = self._init_players([(None, None, os.getlogin())]+clients, hands, [player.score for player in self.players])
+        self.last_draw = None
         self.end = False
+    
+    
+    # Stops preparing rounds
+    def close(self):
+        self.deals.close()
         
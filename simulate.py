@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# simulate.py
+
+# To parse command line options
+import argparse
+
+# To run games on every core
+import concurrent.futures
+import os
+
+# To seed games
+import random
+import secrets
+
+# The headless game engine
+import engine
+
+# To give every game its own recorded seed
+from deal import Dealer
+
+# Policies that play the seats
+from policies import POLICIES
+
+
+# Returns empty statistics
+def new_stats():
+    return {
+        'games'         : 0,
+        'wins_by_seat'  : [0, 0, 0],
+        'nobody'        : 0,
+        'reasons'       : {'out': 0, 'exhausted': 0, 'draw': 0},
+        'draws_called'  : 0,
+        'draws_won'     : 0,
+        'lengths'       : dict()
+    }
+
+
+# Adds the statistics of other into stats
+def merge_stats(stats, other):
+    stats['games'] += other['games']
+    stats['nobody'] += other['nobody']
+    stats['draws_called'] += other['draws_called']
+    stats['draws_won'] += other['draws_won']
+    for seat in range(len(stats['wins_by_seat'])):
+        stats['wins_by_seat'][seat] += other['wins_by_seat'][seat]
+    for reason in other['reasons']:
+        stats['reasons'][reason] += other['reasons'][reason]
+    for length in other['lengths']:
+        stats['lengths'][length] = stats['lengths'].get(length, 0) + other['lengths'][length]
+    
+    return stats
+
+
+# Plays one game to the end; seat i (i-th in the starting turn order) is played by policies[i]
+# Dealing with random.Random(seed) replays a game exactly (given the same policies)
+def play_game(policies, rng):
+    state = engine.new_game(rng=rng)
+    seats = {player: seat for seat, player in enumerate(state.order)}
+    
+    while state.phase != engine.OVER:
+        player = engine.to_move(state)
+        state = engine.apply(state, policies[seats[player]].choose(state, player, engine.legal_actions(state)))
+    
+    return state, seats
+
+
+# Plays a batch of games in a worker process and returns their statistics
+def run_batch(policy_names, num_games, seed):
+    rng = random.Random(seed)
+    dealer = Dealer(rng.getrandbits(64))
+    policies = [POLICIES[name](random.Random(rng.getrandbits(64))) for name in policy_names]
+    stats = new_stats()
+    
+    for _ in range(num_games):
+        state, seats = play_game(policies, dealer.next_round())
+        
+        stats['games'] += 1
+        stats['reasons'][state.reason] += 1
+        stats['lengths'][state.turns] = stats['lengths'].get(state.turns, 0) + 1
+        
+        if state.winner == engine.NOBODY:
+            stats['nobody'] += 1
+        else:
+            stats['wins_by_seat'][seats[state.winner]] += 1
+        
+        if state.reason == 'draw':
+            stats['draws_called'] += 1
+            if state.winner == state.order[0]:
+                stats['draws_won'] += 1
+    
+    return stats
+
+
+# Plays num_games games across a process pool, yielding the running statistics as each batch finishes
+def simulate(num_games, policy_names, workers=None, batch_size=1000, seed=None):
+    if seed == None:
+        seed = secrets.randbits(64)
+    
+    # Every batch gets its own seed drawn from the run's, so runs with nearby seeds share no games
+    seeds = random.Random(seed)
+    
+    stats = new_stats()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = list()
+        for start in range(0, num_games, batch_size):
+            futures.append(pool.submit(run_batch, policy_names, min(batch_size, num_games - start), seeds.getrandbits(64)))
+        
+        for future in concurrent.futures.as_completed(futures):
+            yield merge_stats(stats, future.result())
+
+
+# Prints a summary of the statistics
+def report(stats):
+    games = stats['games']
+    print(f'Games: {games}')
+    if not games:
+        return
+    
+    for seat, wins in enumerate(stats['wins_by_seat']):
+        print(f'Seat {seat} win rate: {wins / games:.4f}')
+    print(f'Nobody won: {stats["nobody"] / games:.4f}')
+    
+    print(f'Deck exhausted: {stats["reasons"]["exhausted"] / games:.4f}')
+    print(f'Emptied hand: {stats["reasons"]["out"] / games:.4f}')
+    print(f'Draw called: {stats["draws_called"] / games:.4f}')
+    if stats['draws_called']:
+        print(f'Draw call success rate: {stats["draws_won"] / stats["draws_called"]:.4f}')
+    
+    # Game length distribution (turns)
+    lengths = sorted(length for length in stats['lengths'] for _ in range(stats['lengths'][length]))
+    print(f'Turns: min {lengths[0]}, median {lengths[len(lengths) // 2]}, mean {sum(lengths) / games:.2f}, max {lengths[-1]}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate Tong-its games headlessly')
+    parser.add_argument('-n', '--games', type=int, default=10000)
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count())
+    parser.add_argument('-b', '--batch-size', type=int, default=1000)
+    parser.add_argument('-s', '--seed', type=int, default=None)
+    parser.add_argument('-p', '--policies', nargs=3, default=['greedy', 'greedy', 'greedy'], choices=sorted(POLICIES), metavar='POLICY', help='policy of each seat in starting turn order')
+    args = parser.parse_args()
+    
+    stats = new_stats()
+    for stats in simulate(args.games, args.policies, args.workers, args.batch_size, args.seed):
+        print(f'\r{stats["games"]}/{args.games} games', end='', flush=True)
+    print('\n')
+    
+    report(stats)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+# stream.py
+
+# To send updates to every seat at once
+import asyncio
+
+# To send and receive updates
+from config import SETTINGS, drain, get_codec, get_message, send_frame, send_message, write_frame
+
+
+# Returns how many items two lists of cards share from the start
+def common_prefix(old, new):
+    keep = 0
+    while keep < len(old) and keep < len(new) and old[keep] == new[keep]:
+        keep += 1
+    return keep
+
+
+# Returns the operations that turn the old public view of a game (gamestate, players) into the new one:
+#   ['set', key, value]                    a gamestate field changed
+#   ['discard', keep, cards]               the discard pile kept its first keep cards, then cards were put on it
+#   ['player', j, key, value]              a field of player j changed
+#   ['meld', j, meld_id, keep, cards]      meld meld_id of player j kept its first keep cards and gained cards (a new
+#                                          meld when meld_id is past the end; replaced outright when keep is None)
+#   ['melds', j, melds]                    player j's melds were replaced (they shrank, e.g. in a new game)
+def diff(old, new):
+    old_state, old_players = old
+    new_state, new_players = new
+    operations = list()
+    
+    for key in new_state:
+        if key == 'discard':
+            keep = common_prefix(old_state['discard'], new_state['discard'])
+            if keep != len(old_state['discard']) or keep != len(new_state['discard']):
+                operations.append(['discard', keep, new_state['discard'][keep:]])
+        
+        elif new_state[key] != old_state.get(key):
+            operations.append(['set', key, new_state[key]])
+    
+    for j in range(len(new_players)):
+        before = old_players[j]
+        after = new_players[j]
+        
+        for key in after:
+            if key == 'melds':
+                if len(after['melds']) < len(before['melds']):
+                    operations.append(['melds', j, after['melds']])
+                    continue
+                
+                for meld_id, meld in enumerate(after['melds']):
+                    if meld_id >= len(before['melds']):
+                        operations.append(['meld', j, meld_id, 0, meld])
+                    
+                    elif meld != before['melds'][meld_id]:
+                        if meld == None or before['melds'][meld_id] == None:
+                            operations.append(['meld', j, meld_id, None, meld])
+                        else:
+                            keep = common_prefix(before['melds'][meld_id], meld)
+                            operations.append(['meld', j, meld_id, keep, meld[keep:]])
+            
+            elif after[key] != before.get(key):
+                operations.append(['player', j, key, after[key]])
+    
+    return operations
+
+
+# Returns the operations that turn a seat's old private view ({'id', 'hand'}) into the new one:
+#   ['hand', removed, added]               cards left your hand and were added at its end
+#   ['player', id, 'hand', hand]           your hand was sent whole, as its cards were reordered (e.g. a new deal)
+def diff_private(old, new):
+    old_cards = set(tuple(card) for card in old['hand'])
+    new_cards = set(tuple(card) for card in new['hand'])
+    kept = [card for card in old['hand'] if tuple(card) in new_cards]
+    added = [card for card in new['hand'] if tuple(card) not in old_cards]
+    
+    if kept + added != new['hand']:
+        return [['player', new['id'], 'hand', new['hand']]]
+    
+    if old_cards != new_cards:
+        return [['hand', [card for card in old['hand'] if tuple(card) not in new_cards], added]]
+    
+    return []
+
+
+# The host's end of a seat's state stream. The first update is a full snapshot and every later one is a delta from
+# the previous update, each numbered one higher than the last; a client that misses one asks for a resync and gets a
+# fresh snapshot. A reader task answers resync requests as they arrive and queues the seat's other messages for
+# receive().
+# Each update holds the public part of the view, shared by every seat of a StateBroadcast and encoded once for all
+# of them, and the seat's private part (its id and hand), encoded for the seat alone.
+class SeatStream:
+    def __init__(self, reader, writer, name=None):
+        self.reader = reader
+        self.writer = writer
+        self.name = name
+        
+        # Number of the last update sent, and the private view it left the seat with
+        self.seq = 0
+        self.private = None
+        
+        # The broadcast holding the public view, set when the stream joins one
+        self.broadcast = None
+        
+        # The reader task and the messages it read, started with the first update or receive()
+        self.task = None
+        self.messages = None
+    
+    
+    # Returns the frame of the next update: a snapshot, or a delta from the last private view sent
+    def frame(self, private, snapshot):
+        codec = get_codec(self.writer)
+        self.seq += 1
+        
+        fragments = {'seq': codec.fragment(self.seq)}
+        if snapshot:
+            fragments['snapshot'] = self.broadcast.fragment(codec, 'snapshot')
+            fragments['private'] = codec.fragment(private)
+        else:
+            fragments['delta'] = self.broadcast.fragment(codec, 'delta')
+            fragments['private'] = codec.fragment(diff_private(self.private, private))
+        
+        self.private = private
+        return codec.frame_fragments(fragments)
+    
+    
+    # Returns the frame carrying the seat's private view with the broadcast's current public view
+    def update(self, private):
+        return self.frame(private, self.private == None or self.broadcast.delta == None)
+    
+    
+    # Starts reading the seat's messages
+    def start(self):
+        if self.task == None:
+            self.messages = asyncio.Queue()
+            self.task = asyncio.create_task(self._read())
+    
+    
+    # Stops reading the seat's messages
+    def close(self):
+        if self.task != None:
+            self.task.cancel()
+    
+    
+    # Answers resync requests at once with a snapshot of the latest update, and queues every other message (or the
+    # error that ended the connection)
+    async def _read(self):
+        while True:
+            try:
+                message = await get_message(self.reader)
+            
+            except Exception as error:
+                self.messages.put_nowait(error)
+                return
+            
+            if message.get('command') != 'resync':
+                self.messages.put_nowait(message)
+            
+            elif self.private != None:
+                await send_frame(self.writer, self.frame(self.private, True))
+    
+    
+    # Returns the seat's next message other than a resync request
+    async def receive(self):
+        self.start()
+        message = await self.messages.get()
+        
+        # A closed connection stays closed for every later receive()
+        if isinstance(message, Exception):
+            self.messages.put_nowait(message)
+            raise message
+        
+        return message
+
+
+# Sends every seat of a table the same versions of the public view. Each version is diffed from the last once, and
+# its delta and snapshot are encoded at most once per codec however many seats receive them, so a push costs the
+# public encoding plus a small private part per seat. Seats are sent to concurrently, so a push takes as long as
+# the slowest seat rather than the sum of them, and no longer than the timeout.
+class StateBroadcast:
+    def __init__(self, streams, timeout=None):
+        self.streams = streams
+        for stream in streams:
+            stream.broadcast = self
+        
+        self.timeout = timeout if timeout != None else SETTINGS.SEND_TIMEOUT
+        
+        # The public view last sent, the operations that led to it (None for the first) and its encodings,
+        # {(codec name, 'delta' or 'snapshot'): fragment}
+        self.public = None
+        self.delta = None
+        self.fragments = dict()
+        
+        # Names of the seats still receiving the last push when the timeout ran out
+        self.stragglers = list()
+    
+    
+    # Returns the current version's delta or snapshot encoded by a codec
+    def fragment(self, codec, kind):
+        key = (codec.name, kind)
+        if key not in self.fragments:
+            value = self.delta if kind == 'delta' else {'gamestate': self.public[0], 'players': self.public[1]}
+            self.fragments[key] = codec.fragment(value)
+        
+        return self.fragments[key]
+    
+    
+    # Sends a new version of the public view (gamestate, players) to every seat, each with its private view
+    # (privates[k] for streams[k]), and returns how many seats it reached in time
+    async def send(self, gamestate, players, privates):
+        self.delta = diff(self.public, (gamestate, players)) if self.public != None else None
+        self.public = (gamestate, players)
+        self.fragments = dict()
+        
+        # Every frame is built and written before anything is awaited, so a resync answered meanwhile comes after the
+        # update and snapshots the same version of it. Only the drains are waited on, so a seat that runs out of time
+        # only stops waiting for its connection to take the frame; the frame still arrives, in order.
+        tasks = dict()
+        for stream, private in zip(self.streams, privates):
+            stream.start()
+            if write_frame(stream.writer, stream.update(private)):
+                tasks[asyncio.create_task(drain(stream.writer))] = stream
+        
+        self.stragglers = list()
+        if not tasks:
+            return 0
+        
+        done, pending = await asyncio.wait(tasks, timeout=self.timeout)
+        for task in pending:
+            task.cancel()
+        
+        self.stragglers = [tasks[task].name for task in tasks if task in pending]
+        return sum(task.result() for task in done)
+    
+    
+    # Stops reading every seat's messages
+    def close(self):
+        for stream in self.streams:
+            stream.close()
+
+
+# A client's copy of its view of the game, kept up to date from a SeatStream
+class StateMirror:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        
+        self.seq = None
+        self.gamestate = None
+        self.players = None
+        
+        # Whether a resync was requested and its snapshot has not come yet
+        self.resyncing = False
+    
+    
+    # Returns the next view of the game (gamestate, players), requesting a resync if an update was missed
+    async def receive(self):
+        while True:
+            message = await get_message(self.reader)
+            
+            if 'snapshot' in message:
+                private = message['private']
+                self.gamestate = message['snapshot']['gamestate']
+                self.players = message['snapshot']['players']
+                self.gamestate['id'] = private['id']
+                self.players[private['id']]['hand'] = private['hand']
+                self.seq = message['seq']
+                self.resyncing = False
+                return self.view()
+            
+            if self.seq != None and message['seq'] == self.seq + 1 and not self.resyncing:
+                self.apply(message['delta'])
+                self.apply(message['private'])
+                self.seq = message['seq']
+                return self.view()
+            
+            # Updates are skipped until the snapshot comes
+            if not self.resyncing:
+                self.resyncing = True
+                await send_message(self.writer, {'command': 'resync'})
+    
+    
+    def apply(self, operations):
+        for operation in operations:
+            kind = operation[0]
+            
+            if kind == 'set':
+                self.gamestate[operation[1]] = operation[2]
+            
+            elif kind == 'discard':
+                del self.gamestate['discard'][operation[1]:]
+                self.gamestate['discard'].extend(operation[2])
+            
+            elif kind == 'player':
+                self.players[operation[1]][operation[2]] = operation[3]
+            
+            elif kind == 'hand':
+                player = self.players[self.gamestate['id']]
+                removed = set(tuple(card) for card in operation[1])
+                player['hand'] = [card for card in player['hand'] if tuple(card) not in removed] + operation[2]
+            
+            elif kind == 'meld':
+                melds = self.players[operation[1]]['melds']
+                meld_id, keep, cards = operation[2], operation[3], operation[4]
+                if meld_id == len(melds):
+                    melds.append(cards)
+                elif keep == None:
+                    melds[meld_id] = cards
+                else:
+                    del melds[meld_id][keep:]
+                    melds[meld_id].extend(cards)
+            
+            elif kind == 'melds':
+                self.players[operation[1]]['melds'] = operation[2]
+            
+            else:
+                raise ValueError(f'unknown update {kind!r}')
+    
+    
+    # Returns a copy of the view, so callers may change it without touching the mirror
+    def view(self):
+        gamestate = dict(self.gamestate)
+        gamestate['discard'] = list(gamestate['discard'])
+        gamestate['order'] = list(gamestate['order'])
+        
+        players = list()
+        for player in self.players:
+            player = dict(player)
+            player['melds'] = [list(meld) if meld != None else None for meld in player['melds']]
+            if 'hand' in player:
+                player['hand'] = list(player['hand'])
+            players.append(player)
+        
+        return gamestate, players
@@ -14,33 +14,93 @@ import os
 import asyncio
 
 # To send lists of cards as messages
-from server import decompose, compose, Server
+from server import decompose, Server, CARDS
 
 # To simplify message sending and receiving
-from config import send_message, get_message, Constants
+from config import send_message, CONSTANTS, SETTINGS
 
+# The game rules the host and clients drive
+from engine import PICK, PLAY, RESPOND, from_server, to_server, to_move, legal_actions, apply
 
-# Send game state to players other than host
-async def send_gamestate(ret_val, server, winner):
-    for i in range(1, len(server.players)):
-        
-        # Send remaining deck size, discard, and order of play
-        await send_message(ret_val[i-1][1], {'deck_size': len(server.deck), 'discard': decompose(server.discard), 'order': server.order, 'id': i, 'winner': winner})
-        
-        # Send each players' information to each player
-        for j in range(0, len(server.players)):
-            
-            # Send detailed info if it's the player's own info
-            if i == j:
-                await send_message(ret_val[i-1][1], {'score': server.players[j].score, 'name': server.players[j].name, 'hand': decompose(server.players[j].hand), 'melds': [decompose(meld) for meld in server.players[j].melds], 'can_draw': server.players[j].can_draw})
-            
-            # Send vague info if it's not the player's own info
-            else:
-                await send_message(ret_val[i-1][1], {'score': server.players[j].score, 'name': server.players[j].name, 'num_cards': len(server.players[j].hand), 'melds': [decompose(meld) if meld else None for meld in server.players[j].melds], 'can_draw': server.players[j].can_draw})
+# To check and find melds
+from melds import card_index, hand_mask, HandState
+
+# To stream the game state to clients
+from stream import SeatStream, StateBroadcast, StateMirror
+
+# To fill empty seats with bots
+from bot import BotSeat, STRATEGIES, observe, observe_state
+
+# To track the cards you have seen
+from tracker import CardTracker
+
+# To estimate the chance of winning a called draw
+from advisor import advise_draw, describe_odds, rank_discards, describe_discard
+
+# Returns the view of the game every player shares: the deck size, discard, order of play, who drew the last card
+# from the deck and the winner, and each player's public information
+def public_view(server, winner):
+    gamestate = {'deck_size': len(server.deck), 'discard': decompose(server.discard), 'order': list(server.order), 'last_draw': server.last_draw, 'winner': winner}
+    
+    players = list()
+    for player in server.players:
+        players.append({'score': player.score, 'name': player.name, 'num_cards': len(player.hand), 'melds': [decompose(meld) if meld else None for meld in player.melds], 'can_draw': player.can_draw})
+    
+    return gamestate, players
+
+
+# Returns what only player i sees: their id and hand
+def private_view(server, i):
+    return {'id': i, 'hand': decompose(server.players[i].hand)}
+
+
+# Send game state to players other than host, as an update of the state stream of each
+async def send_gamestate(broadcast, server, winner):
+    await broadcast.send(*public_view(server, winner), [private_view(server, i) for i in range(1, len(server.players))])
+
+
+# Returns the winner sent with a gamestate: -1 while the game goes on, -3 while the others answer a called draw, then
+# the winner, or -2 if nobody exposed a meld before the deck ran out
+def winner_code(state):
+    if state.phase == RESPOND:
+        return -3
+    
+    return state.winner
 
 
-# Display function for host (Draws other clients in turn order first, then self last)
-def host_display(server):
+# Returns the engine action a client's message asks for
+def parse_action(message):
+    command = message.get('command') or message.get('draw_response')
+    
+    if command == 'pick_discard' or command == 'expose':
+        return (command, hand_mask(message['cards']))
+    
+    if command == 'lay_off':
+        return (command, card_index(message['card']), message['player_id'], message['meld_id'])
+    
+    if command == 'discard':
+        return (command, card_index(message['card']))
+    
+    return (command,)
+
+
+# Receives the next gamestate and each player's info from the state stream, syncing your hand into hand_state and
+# the cards seen into tracker
+async def get_gamestate(mirror, hand_state, tracker):
+    gamestate, players = await mirror.receive()
+    players[gamestate['id']]['hand'] = hand_state.sync(players[gamestate['id']]['hand'])
+    tracker.update(gamestate, players)
+    
+    return gamestate, players
+
+
+# Display function for host (Draws other clients in turn order first, then self last, after the clients whose
+# connections are too slow to keep up)
+def host_display(server, stragglers=()):
+    if stragglers:
+        print(f'Slow connection: {", ".join(stragglers)}')
+        print()
+    
     # Determine client player draw order
     draw_order = server.order[server.order.index(0)+1:] + server.order[:server.order.index(0)]
     for i in draw_order:
@@ -52,8 +112,7 @@ def host_display(server):
         # Display melds
         print(f'Melds:')
         for meld in server.players[i].melds:
-            meld.sort(key=lambda x: x.suit)
-            meld.sort(key=lambda x: Constants().RANKS.index(x.rank))
+            meld.sort(key=lambda x: CONSTANTS.CARD_ORDER[(x.rank, x.suit)])
             print(f'{meld[0].rank.rjust(2)}{meld[0].suit}', end='')
             for j in range(1, len(meld)):
                 print(f' {meld[j].rank.rjust(2)}{meld[j].suit}', end='')
@@ -68,8 +127,7 @@ def host_display(server):
     # Display melds
     print(f'Melds:')
     for meld in server.players[0].melds:
-        meld.sort(key=lambda x: x.suit)
-        meld.sort(key=lambda x: Constants().RANKS.index(x.rank))
+        meld.sort(key=lambda x: CONSTANTS.CARD_ORDER[(x.rank, x.suit)])
         print(f'{meld[0].rank.rjust(2)}{meld[0].suit}', end='')
         for j in range(1, len(meld)):
             print(f' {meld[j].rank.rjust(2)}{meld[j].suit}', end='')
@@ -86,14 +144,27 @@ def host_display(server):
     
     # Display hand
     if server.players[0].hand:
-        server.players[0].hand.sort(key=lambda x: x.suit)
-        server.players[0].hand.sort(key=lambda x: Constants().RANKS.index(x.rank))
+        server.players[0].hand.sort(key=lambda x: CONSTANTS.CARD_ORDER[(x.rank, x.suit)])
         print(f'Hand: {server.players[0].hand[0].rank.rjust(2)}{server.players[0].hand[0].suit}', end='')
         for i in range(1, len(server.players[0].hand)):
             print(f' {server.players[0].hand[i].rank.rjust(2)}{server.players[0].hand[i].suit}', end='')
     print('\n')
 
 
+# Returns the space-separated hand indices of the cards of a meld (as a mask)
+def suggest_meld(hand, meld):
+    return ' '.join(str(i) for i, card in enumerate(hand) if meld >> card_index(card) & 1)
+
+
+# Prints how to accept the suggested meld, if there is one, and returns the suggestion
+def offer_meld(hand, meld):
+    suggestion = suggest_meld(hand, meld)
+    if suggestion:
+        print(f'(Press enter to meld {suggestion})')
+    
+    return suggestion
+
+
 # Display function for clients (Draws other players in turn-order first, then self last)
 def client_display(gamestate, players):
     # Determine client player draw order (order of drawing aka printing to display)
@@ -107,8 +178,7 @@ def client_display(gamestate, players):
         # Display melds
         print(f'Melds:')
         for meld in players[i]['melds']:
-            meld.sort(key=lambda x: x[1])
-            meld.sort(key=lambda x: Constants().RANKS.index(x[0]))
+            meld.sort(key=lambda x: CONSTANTS.CARD_ORDER[(x[0], x[1])])
             print(f'{meld[0][0].rjust(2)}{meld[0][1]}', end='')
             for j in range(1, len(meld)):
                 print(f' {meld[j][0].rjust(2)}{meld[j][1]}', end='')
@@ -123,8 +193,7 @@ def client_display(gamestate, players):
     # Display melds
     print(f'Melds:')
     for meld in players[gamestate['id']]['melds']:
-        meld.sort(key=lambda x: x[1])
-        meld.sort(key=lambda x: Constants().RANKS.index(x[0]))
+        meld.sort(key=lambda x: CONSTANTS.CARD_ORDER[(x[0], x[1])])
         print(f'{meld[0][0].rjust(2)}{meld[0][1]}', end='')
         for j in range(1, len(meld)):
             print(f' {meld[j][0].rjust(2)}{meld[j][1]}', end='')
@@ -141,61 +210,13 @@ def client_display(gamestate, players):
     
     # Display hand
     if players[gamestate["id"]]["hand"]:
-        players[gamestate['id']]['hand'].sort(key=lambda x: x[1])
-        players[gamestate['id']]['hand'].sort(key=lambda x: Constants().RANKS.index(x[0]))
+        players[gamestate['id']]['hand'].sort(key=lambda x: CONSTANTS.CARD_ORDER[(x[0], x[1])])
         print(f'Hand: {players[gamestate["id"]]["hand"][0][0].rjust(2)}{players[gamestate["id"]]["hand"][0][1]}', end='')
         for i in range(1, len(players[gamestate['id']]['hand'])):
             print(f' {players[gamestate["id"]]["hand"][i][0].rjust(2)}{players[gamestate["id"]]["hand"][i][1]}', end='')
     print('\n')
 
 
-# Meld verifier
-def verify_meld(decomposed_cards):
-    
-    # Meld must be at least 3 cards
-    if len(decomposed_cards) < 3:
-        return False
-    
-    # Cards in meld must all be unique
-    for i in range(len(decomposed_cards) - 1):
-        for j in range(i + 1, len(decomposed_cards)):
-            if decomposed_cards[i][0] == decomposed_cards[j][0] and decomposed_cards[i][1] == decomposed_cards[j][1]:
-                return False
-    
-    # All cards in meld must either be of same rank...
-    all_same = True
-    for card in decomposed_cards[1:]:
-        if card[0] != decomposed_cards[0][0]:
-            all_same = False
-            break
-    
-    if all_same:
-        return True
-    
-    # ...or cards in meld must be of same suit and sequentially orderable
-    decomposed_cards.sort(key=lambda x: x[1])
-    decomposed_cards.sort(key=lambda x: Constants().RANKS.index(x[0]))
-    
-    for i in range(1, len(decomposed_cards)):
-        if decomposed_cards[i][1] != decomposed_cards[0][1] or Constants().RANKS.index(decomposed_cards[i][0]) != Constants().RANKS.index(decomposed_cards[i-1][0]) + 1:
-            return False
-    
-    return True
-
-
-# Find meld
-def find_meld(decomposed_cards, required_card=None):
-    
-    for i in range(len(decomposed_cards) - 2):
-        for j in range(i + 1, len(decomposed_cards) - 1):
-            for k in range(j + 1, len(decomposed_cards)):
-                if verify_meld([decomposed_cards[i], decomposed_cards[j], decomposed_cards[k]]):
-                    if required_card == None or required_card in [decomposed_cards[i], decomposed_cards[j], decomposed_cards[k]]:
-                        return True
-    
-    return False
-
-
 async def main(state_info):
     
     ret_val = await lobby.setState(state_info)
@@ -207,153 +228,45 @@ async def main(state_info):
     # Host
     if type(ret_val) is list:
         
+        # Fill the seats nobody joined with bots
+        for i in range(len(ret_val) + 1, CONSTANTS.NUM_PLAYERS):
+            ret_val.append(BotSeat(STRATEGIES[SETTINGS.BOT_STRATEGY]()).connect(f'bot{i}'))
+        
         # Create Server
         server = Server(ret_val)
         
+        # A state stream to each client
+        streams = [SeatStream(reader, writer, name) for reader, writer, name in ret_val]
+        broadcast = StateBroadcast(streams)
+        
         while True:
-            # Winner player_id
-            winner = -1
+            # The game as the engine sees it; every action is checked against its rules and applied to it, then
+            # written back to the server the display and the gamestates are drawn from
+            state = from_server(server)
+            
+            # The cards you have seen this game
+            tracker = CardTracker(0)
             
             # Play a turn
-            while not server.end:
+            while state.phase == PICK or state.phase == PLAY:
                 # Send gamestate
-                await send_gamestate(ret_val, server, winner)
+                await send_gamestate(broadcast, server, winner_code(state))
                 
                 # Display game state
                 os.system('clear')
-                host_display(server)
+                host_display(server, broadcast.stragglers)
                 
-                # Wait until it's your turn
-                while server.order[0] != 0 and winner == -1:
-                    sabotage = False
-                    print(f'{server.players[server.order[0]].name}\'s turn...')
-                    
-                    # Wait for client player to send action
-                    message = await get_message(ret_val[server.order[0]-1][0])
-                    
-                    # Parse action message
-                    if message['command'] == 'pick_deck':
-                        # Pop card from deck and add it to player's hand
-                        server.players[server.order[0]].hand.append(server.deck.pop())
-                        
-                        # Save the player id who drew the last card
-                        server.last_draw = server.order[0]
-                        
-                        # Disable player from calling draw
-                        server.players[server.order[0]].can_draw = False
-                    
-                    elif message['command'] == 'pick_discard':
-                        # Removes melded cards from player's hand
-                        for meld_card in message['cards']:
-                            if meld_card in decompose(server.players[server.order[0]].hand):
-                                for card in server.players[server.order[0]].hand:
-                                    if card.rank == meld_card[0] and card.suit == meld_card[1]:
-                                        server.players[server.order[0]].hand.remove(card)
-                                        break
-                        
-                        # Pop card from discard and add meld to player's melds
-                        server.players[server.order[0]].melds.append(compose(decompose([server.discard.pop()]) + message['cards']))
-                        
-                        # Disable player who discarded the card from calling draw
-                        server.players[server.order[-1]].can_draw = False
-                        
-                        # Disable player from calling draw
-                        server.players[server.order[0]].can_draw = False
-                        
-                        # Check if game is over
-                        if not server.players[server.order[0]].hand:
-                            winner = server.order[0]
-                            server.end = True
-                            break
-                    
-                    elif message['command'] == 'draw':
-                        winner = -3
-                        server.end = True
-                        break
+                # Client player's turn
+                if state.order[0] != 0:
+                    print(f'{server.players[state.order[0]].name}\'s turn...')
                     
-                    elif message['command'] == 'expose':
-                        # Remove cards from player's hand
-                        for meld_card in message['cards']:
-                            if meld_card in decompose(server.players[server.order[0]].hand):
-                                for card in server.players[server.order[0]].hand:
-                                    if card.rank == meld_card[0] and card.suit == meld_card[1]:
-                                        server.players[server.order[0]].hand.remove(card)
-                                        break
-                        
-                        # Add meld to player's melds
-                        server.players[server.order[0]].melds.append(compose(message['cards']))
-                        
-                        # Disable player from calling draw
-                        server.players[server.order[0]].can_draw = False
-                        
-                        # Check if game is over
-                        if not server.players[server.order[0]].hand:
-                            winner = server.order[0]
-                            server.end = True
-                            break
+                    # Wait for client player to send action, and ignore it if the rules do not allow it
+                    action = parse_action(await streams[state.order[0]-1].receive())
+                    if action in legal_actions(state):
+                        state = apply(state, action)
+                        to_server(state, server)
                     
-                    elif message['command'] == 'lay_off':
-                        # Remove card from player's hand
-                        for card in server.players[server.order[0]].hand:
-                            if card.rank == message['card'][0] and card.suit == message['card'][1]:
-                                server.players[server.order[0]].hand.remove(card)
-                                break
-                        
-                        # Add card to meld
-                        server.players[message['player_id']].melds[message['meld_id']].append(compose([message['card']])[0])
-                        
-                        # Disable player whose meld got added to from calling draw
-                        server.players[message['player_id']].can_draw = False
-                        if message['player_id'] == server.order[0]:
-                            sabotage = True
-                        
-                        # Disable player from calling draw
-                        server.players[server.order[0]].can_draw = False
-                        
-                        # Check if game is over
-                        if not server.players[server.order[0]].hand:
-                            winner = server.order[0]
-                            server.end = True
-                            break
-                    
-                    elif message['command'] == 'discard':
-                        # Remove card from player's hand
-                        for card in server.players[server.order[0]].hand:
-                            if card.rank == message['card'][0] and card.suit == message['card'][1]:
-                                server.players[server.order[0]].hand.remove(card)
-                        
-                        # Add card to discard
-                        server.discard += compose([message['card']])
-                        
-                        # Enable player to call draw if they have an exposed meld
-                        if server.players[server.order[0]].melds and not sabotage:
-                            server.players[server.order[0]].can_draw = True
-                        sabotage = False
-                        
-                        # Check if game is over
-                        if not server.players[server.order[0]].hand:
-                            winner = server.order[0]
-                            server.end = True
-                            break
-                        
-                        # Check if deck is exhausted...
-                        if not server.deck:
-                            winner = -2
-                            server.end = True
-                            break
-                        
-                        # End turn, and begin the next player's turn
-                        server.order = server.order[1:] + [server.order[0]]
-                    
-                    # Send gamestate
-                    await send_gamestate(ret_val, server, winner)
-                    
-                    # Redraw display
-                    os.system('clear')
-                    host_display(server)
-                
-                if server.end:
-                    break
+                    continue
                 
                 # Rules (https://www.pagat.com/rummy/tong-its.html)
                 # 1) Draw
@@ -381,51 +294,40 @@ async def main(state_info):
                 #    - Once you discard a card from your hand, your turn ends
                 #    - You must discard a card from your hand before the next player's turn can begin
                 
-                # Bool to remember whether pick discard is valid
-                can_pick_discard = False
-                
-                # Bool to remember if you sabotaged urself by laying off on ur own meld so now u cant actually call a draw next turn.
-                sabotage = False
-                
-                # Display option to pick up from deck
-                print('0: Pick up a card from the top of the deck')
+                # Everything the rules allow you to do now
+                actions = legal_actions(state)
                 
-                # Check if player can pick up from discard
-                if server.discard:
-                    can_pick_discard = find_meld(decompose(server.players[0].hand) + decompose([server.discard[-1]]), decompose([server.discard[-1]])[0])
+                if state.phase == PICK:
+                    # Melds you can expose with the top card of the discard
+                    picks = [action for action in actions if action[0] == 'pick_discard']
+                    
+                    # Display option to pick up from deck
+                    print('0: Pick up a card from the top of the deck')
                     
-                    if can_pick_discard:
+                    # Check if player can pick up from discard
+                    if picks:
                         print('1: Pick up a card from the top of the discard to expose a meld')
-                
-                # Display option to draw if player can
-                if server.players[0].can_draw:
-                    print('2: Call draw')
-                
-                # Get player's choice
-                choice = input('\n> ')
-                while not choice.isnumeric() or int(choice) > 2 or (int(choice) == 1 and not can_pick_discard) or (int(choice) == 2 and not server.players[0].can_draw):
-                    print('\nInvalid input')
-                    choice = input('\n> ')
-                
-                # Process choice
-                if choice == '0':
-                    # Pop card from deck and add it to hand
-                    server.players[server.order[0]].hand.append(server.deck.pop())
                     
-                    # Save your id as the last player who drew a card
-                    server.last_draw = server.order[0]
+                    # Display option to draw if player can
+                    if ('draw',) in actions:
+                        # Estimate the chance the draw wins
+                        tracker.update_state(state)
+                        odds = await advise_draw(observe_state(state, 0, tracker))
+                        print(f'2: Call draw{describe_odds(odds, "draw")}')
                     
-                    # Disable self from calling draw
-                    server.players[server.order[0]].can_draw = False
-                
-                elif choice == '1':
-                    # Get desired melded cards
-                    meld = list()
+                    # Get player's choice
+                    choice = input('\n> ')
+                    while not choice.isnumeric() or int(choice) > 2 or (int(choice) == 1 and not picks) or (int(choice) == 2 and ('draw',) not in actions):
+                        print('\nInvalid input')
+                        choice = input('\n> ')
+                    
+                    # Process choice
+                    if choice == '0':
+                        action = ('pick_deck',)
                     
-                    while not meld:
+                    elif choice == '1':
                         # Display hand
-                        server.players[0].hand.sort(key=lambda x: x.suit)
-                        server.players[0].hand.sort(key=lambda x: Constants().RANKS.index(x.rank))
+                        server.players[0].hand.sort(key=lambda x: CONSTANTS.CARD_ORDER[(x.rank, x.suit)])
                         print(f'{server.players[0].hand[0].rank.rjust(2)}{server.players[0].hand[0].suit}', end='')
                         for i in range(1, len(server.players[0].hand)):
                             print(f' {server.players[0].hand[i].rank.rjust(2)}{server.players[0].hand[i].suit}', end='')
@@ -439,88 +341,44 @@ async def main(state_info):
                         
                         print('\nChoose which cards you wish to meld (space-separated list of numbers)')
                         
-                        choices = input('\n> ')
+                        # Offer the first meld found as the default
+                        suggestion = offer_meld(server.players[0].hand, picks[0][1])
+                        
+                        choices = input('\n> ') or suggestion
                         
                         # Error check input
-                        while not all(card.isnumeric() and int(card) < len(server.players[0].hand) for card in choices.split()) or not verify_meld(decompose([server.players[0].hand[int(num)] for num in choices.split()]) + decompose([server.discard[-1]])):
+                        while not all(card.isnumeric() and int(card) < len(server.players[0].hand) for card in choices.split()) or ('pick_discard', hand_mask(server.players[0].hand[int(num)] for num in choices.split())) not in picks:
                             print('\nInvalid input')
-                            choices = input('\n> ')
+                            choices = input('\n> ') or suggestion
                         
-                        meld = decompose([server.players[0].hand[int(num)] for num in choices.split()])
-                    
-                    # Removes melded cards from hand
-                    for meld_card in meld:
-                        if meld_card in decompose(server.players[0].hand):
-                            for card in server.players[0].hand:
-                                if card.rank == meld_card[0] and card.suit == meld_card[1]:
-                                    server.players[0].hand.remove(card)
-                                    break
-                    
-                    # Pop card from discard and add meld to melds
-                    server.players[0].melds.append(compose(decompose([server.discard.pop()]) + meld))
-                    
-                    # Disable last player from calling draw
-                    server.players[server.order[-1]].can_draw = False
-                    
-                    # Disable self from calling draw
-                    server.players[0].can_draw = False
+                        action = ('pick_discard', hand_mask(server.players[0].hand[int(num)] for num in choices.split()))
                     
-                    # Check if game is over
-                    if not server.players[0].hand:
-                        winner = 0
-                        server.end = True
-                        break
-                
-                elif choice == '2':
-                    winner = -3
-                    server.end = True
-                    break
+                    elif choice == '2':
+                        action = ('draw',)
                 
-                # Expose/Lay off/Draw loop
-                while server.order[0] == 0 and not server.end:
-                    # Send gamestate
-                    await send_gamestate(ret_val, server, winner)
-                    
-                    # Redraw display
-                    os.system('clear')
-                    host_display(server)
-                    
-                    # Default to false before checking
-                    can_expose_meld = False
+                # Expose/Lay off/Discard
+                else:
+                    # Melds you can expose, and the cards you can lay off on exposed melds
+                    exposes = [action for action in actions if action[0] == 'expose']
+                    lay_offs = [action for action in actions if action[0] == 'lay_off']
                     
-                    # If a valid meld was found
-                    if can_expose_meld := find_meld(decompose(server.players[0].hand)):
+                    if exposes:
                         print('0: Expose a meld')
                     
-                    # If can lay off
-                    can_lay_off = False
-                    for player in server.players:
-                        if player.melds:
-                            for meld in player.melds:
-                                for card in server.players[0].hand:
-                                    if find_meld(decompose(meld + [card]), decompose([card])[0]):
-                                        can_lay_off = True
-                                        break
-                                if can_lay_off:
-                                    break
-                        if can_lay_off:
-                            break
-                    
-                    if can_lay_off:
+                    if lay_offs:
                         print('l: Lay off a card')
                     
                     print('d: Discard a card')
                     
                     choice = input('\n> ')
                     
-                    while (choice != '0' and choice != 'l' and choice != 'd') or (choice == '0' and not can_expose_meld) or (choice == 'l' and not can_lay_off):
+                    while (choice != '0' and choice != 'l' and choice != 'd') or (choice == '0' and not exposes) or (choice == 'l' and not lay_offs):
                         print('\nInvalid input')
                         choice = input('\n> ')
                     
                     if choice == '0':
                         # Display hand
-                        server.players[0].hand.sort(key=lambda x: x.suit)
-                        server.players[0].hand.sort(key=lambda x: Constants().RANKS.index(x.rank))
+                        server.players[0].hand.sort(key=lambda x: CONSTANTS.CARD_ORDER[(x.rank, x.suit)])
                         print(f'{server.players[0].hand[0].rank.rjust(2)}{server.players[0].hand[0].suit}', end='')
                         for i in range(1, len(server.players[0].hand)):
                             print(f' {server.players[0].hand[i].rank.rjust(2)}{server.players[0].hand[i].suit}', end='')
@@ -534,36 +392,21 @@ async def main(state_info):
                         
                         print('\nChoose which cards you wish to meld (space-separated list of numbers)')
                         
-                        choices = input('\n> ')
+                        # Offer the first meld found as the default
+                        suggestion = offer_meld(server.players[0].hand, exposes[0][1])
+                        
+                        choices = input('\n> ') or suggestion
                         
                         # Error check input
-                        while not all(card.isnumeric() and int(card) < len(server.players[0].hand) for card in choices.split()) or not verify_meld(decompose([server.players[0].hand[int(num)] for num in choices.split()])):
+                        while not all(card.isnumeric() and int(card) < len(server.players[0].hand) for card in choices.split()) or ('expose', hand_mask(server.players[0].hand[int(num)] for num in choices.split())) not in exposes:
                             print('\nInvalid input')
-                            choices = input('\n> ')
-                        
-                        meld = decompose([server.players[0].hand[int(num)] for num in choices.split()])
-                        
-                        # Removes melded cards from hand
-                        for meld_card in meld:
-                            if meld_card in decompose(server.players[0].hand):
-                                for card in server.players[0].hand:
-                                    if card.rank == meld_card[0] and card.suit == meld_card[1]:
-                                        server.players[0].hand.remove(card)
-                                        break
+                            choices = input('\n> ') or suggestion
                         
-                        # Add meld to melds
-                        server.players[0].melds.append(compose(meld))
-                        
-                        # Check if game is over
-                        if not server.players[0].hand:
-                            winner = 0
-                            server.end = True
-                            break
+                        action = ('expose', hand_mask(server.players[0].hand[int(num)] for num in choices.split()))
                     
                     elif choice == 'l':
                         # Display hand
-                        server.players[0].hand.sort(key=lambda x: x.suit)
-                        server.players[0].hand.sort(key=lambda x: Constants().RANKS.index(x.rank))
+                        server.players[0].hand.sort(key=lambda x: CONSTANTS.CARD_ORDER[(x.rank, x.suit)])
                         print(f'{server.players[0].hand[0].rank.rjust(2)}{server.players[0].hand[0].suit}', end='')
                         for i in range(1, len(server.players[0].hand)):
                             print(f' {server.players[0].hand[i].rank.rjust(2)}{server.players[0].hand[i].suit}', end='')
@@ -579,43 +422,24 @@ async def main(state_info):
                         
                         choice = input('\n> ')
                         
-                        melds = [meld for player in server.players if player.melds for meld in player.melds]
-                        
-                        valid_input = choice.isnumeric() and int(choice) < len(server.players[0].hand) and not all(not find_meld(decompose(meld + [server.players[0].hand[int(choice)]]), decompose([server.players[0].hand[int(choice)]])[0]) for meld in melds)
-                        
                         # Verify input
-                        while not valid_input:
+                        while not choice.isnumeric() or int(choice) >= len(server.players[0].hand) or not any(lay_off[1] == server.players[0].hand[int(choice)].id for lay_off in lay_offs):
                             print('\nInvalid input')
                             choice = input('\n> ')
-                            
-                            valid_input = choice.isnumeric() and int(choice) < len(server.players[0].hand) and not all(not find_meld(decompose(meld + [server.players[0].hand[int(choice)]]), decompose([server.players[0].hand[int(choice)]])[0]) for meld in melds)
                         
                         # Compile viable melds
-                        melds = list()
-                        player_ids = list()
-                        id_num = 0
-                        meld_ids = list()
-                        for player in server.players:
-                            if player.melds:
-                                meld_num = 0
-                                for meld in player.melds:
-                                    if find_meld(decompose(meld + [server.players[0].hand[int(choice)]]), decompose([server.players[0].hand[int(choice)]])[0]):
-                                        melds.append(meld)
-                                        player_ids.append(id_num)
-                                        meld_ids.append(meld_num)
-                                    meld_num += 1
-                            id_num += 1
+                        targets = [lay_off for lay_off in lay_offs if lay_off[1] == server.players[0].hand[int(choice)].id]
                         
                         meld_choice = None
-                        if len(melds) > 1:
+                        if len(targets) > 1:
                             # Display melds
                             num_meld = 0
-                            for meld in melds:
-                                meld.sort(key=lambda x: x[1])
-                                meld.sort(key=lambda x: Constants().RANKS.index(x[0]))
-                                print(f'{num_meld}: {meld[0][0].rjust(2)}{meld[0][1]}', end='')
+                            for target in targets:
+                                meld = server.players[target[2]].melds[target[3]]
+                                meld.sort(key=lambda x: CONSTANTS.CARD_ORDER[(x.rank, x.suit)])
+                                print(f'{num_meld}: {meld[0].rank.rjust(2)}{meld[0].suit}', end='')
                                 for j in range(1, len(meld)):
-                                    print(f'{meld[j][0].rjust(2)}{meld[j][1]}', end='')
+                                    print(f' {meld[j].rank.rjust(2)}{meld[j].suit}', end='')
                                 print()
                                 num_meld += 1
                             print()
@@ -623,7 +447,7 @@ async def main(state_info):
                             print('Choose which meld you wish to lay off on')
                             meld_choice = input('\n> ')
                             
-                            while not meld_choice.isnumeric() or int(meld_choice) >= len(melds) or not verify_meld(decompose(server.players[player_ids[meld_choice]].melds[meld_ids[meld_choice]]) + decompose([server.players[0].hand[int(choice)]])):
+                            while not meld_choice.isnumeric() or int(meld_choice) >= len(targets):
                                 print('\nInvalid input')
                                 meld_choice = input('\n> ')
                             
@@ -633,35 +457,11 @@ async def main(state_info):
                             meld_choice = 0
                         
                         # Lay off card
-                        message = {'card': decompose([server.players[0].hand[int(choice)]])[0], 'player_id': player_ids[meld_choice], 'meld_id': meld_ids[meld_choice]}
-                        
-                        # Remove card from player's hand
-                        for card in server.players[server.order[0]].hand:
-                            if card.rank == message['card'][0] and card.suit == message['card'][1]:
-                                server.players[server.order[0]].hand.remove(card)
-                                break
-                        
-                        # Add card to meld
-                        server.players[message['player_id']].melds[message['meld_id']].append(compose([message['card']])[0])
-                        
-                        # Disable player whose meld got added to from calling draw
-                        server.players[message['player_id']].can_draw = False
-                        if message['player_id'] == 0:
-                            sabotage = True
-                        
-                        # Disable player from calling draw
-                        server.players[server.order[0]].can_draw = False
-                        
-                        # Check if game is over
-                        if not server.players[server.order[0]].hand:
-                            winner = 0
-                            server.end = True
-                            break
+                        action = targets[meld_choice]
                     
                     elif choice == 'd':
                         # Display hand
-                        server.players[0].hand.sort(key=lambda x: x.suit)
-                        server.players[0].hand.sort(key=lambda x: Constants().RANKS.index(x.rank))
+                        server.players[0].hand.sort(key=lambda x: CONSTANTS.CARD_ORDER[(x.rank, x.suit)])
                         print(f'{server.players[0].hand[0].rank.rjust(2)}{server.players[0].hand[0].suit}', end='')
                         for i in range(1, len(server.players[0].hand)):
                             print(f' {server.players[0].hand[i].rank.rjust(2)}{server.players[0].hand[i].suit}', end='')
@@ -675,357 +475,80 @@ async def main(state_info):
                         
                         print('\nChoose which card you wish to discard')
                         
-                        choice = input('\n> ')
+                        # Offer the discard that leaves the fewest points for the least risk of the next player picking it up
+                        tracker.update_state(state)
+                        best = rank_discards(observe_state(state, 0, tracker))[0]
+                        suggestion = str([card.id for card in server.players[0].hand].index(best[0]))
+                        print(f'(Press enter to discard {CARDS[best[0]]}: {describe_discard(best, server.players[server.order[1]].name)})')
+                        
+                        choice = input('\n> ') or suggestion
                         
-                        # TODO: Error check input
                         while not choice.isnumeric() or int(choice) >= len(server.players[0].hand):
                             print('\nInvalid input')
-                            choice = input('\n> ')
-                        
-                        # Move card from hand to discard
-                        server.discard.append(server.players[0].hand.pop(int(choice)))
-                        
-                        # Enable you to call draw if they have an exposed meld
-                        if server.players[0].melds and not sabotage:
-                            server.players[0].can_draw = True
-                        sabotage = False
-                        
-                        # Check if game is over
-                        if not server.players[0].hand:
-                            winner = 0
-                            server.end = True
-                            break
-                        
-                        # Check if game is over
-                        if not server.deck:
-                            winner = -2
-                            server.end = True
-                            break
+                            choice = input('\n> ') or suggestion
                         
-                        # End turn, and begin the next player's turn
-                        server.order = server.order[1:] + [server.order[0]]
+                        # Discard card
+                        action = ('discard', server.players[0].hand[int(choice)].id)
+                
+                state = apply(state, action)
+                to_server(state, server)
             
             # Server game ended ############################
             
-            # If winner == -2, then the deck was exhausted.
-            # If winner == -3, then server.order[0] called Draw.
-            # Otherwise, winner is the winner.
+            # If the winner sent is -3, then server.order[0] called Draw and the others must challenge or fold.
+            # Otherwise the game is over: the winner went out or had the lowest hand, or is -2 if the deck was
+            # exhausted before anyone exposed a meld.
             
             # Send gamestate
-            await send_gamestate(ret_val, server, winner)
+            await send_gamestate(broadcast, server, winner_code(state))
             
             # Display game state
             os.system('clear')
-            host_display(server)
-            
-            # Determine how game ended
-            if winner == -2:
-                # Exhausted deck procedure
-                # 
-                # 1. Make a list of players with exposed melds.
-                candidates = [i for i in range(len(server.players)) if server.players[i].melds]
-                
-                if not candidates:
-                    print('\nNobody exposed a meld; nobody wins.\n')
-                
-                else:
-                    # 2. If host exposed a meld, await their hand after they submit any melds.
-                    if server.players[0].melds:
-                        choice = ''
-                        while choice != 's':
-                            print()
-                            
-                            # If host has any melds to expose
-                            if can_expose_meld := find_meld(decompose(server.players[0].hand)):
-                                print('0: Expose a meld')
-                            else:
-                                print('s: Submit your hand')
-                            
-                            choice = input('\n> ')
-                            
-                            while (choice != '0' and choice != 's') or (choice == '0' and not can_expose_meld) or (choice == 's' and can_expose_meld):
-                                print('\nInvalid input')
-                                choice = input('\n> ')
-                            
-                            if choice == '0':
-                                # Display hand
-                                server.players[0].hand.sort(key=lambda x: x.suit)
-                                server.players[0].hand.sort(key=lambda x: Constants().RANKS.index(x.rank))
-                                print(f'{server.players[0].hand[0].rank.rjust(2)}{server.players[0].hand[0].suit}', end='')
-                                for i in range(1, len(server.players[0].hand)):
-                                    print(f' {server.players[0].hand[i].rank.rjust(2)}{server.players[0].hand[i].suit}', end='')
-                                print()
-                                
-                                # Display enumeration for card select
-                                print('  0', end='')
-                                for i in range(1, len(server.players[0].hand)):
-                                    print(f' {str(i).rjust(3)}', end='')
-                                print()
-                                
-                                print('\nChoose which cards you wish to meld (space-separated list of numbers)')
-                                
-                                choices = input('\n> ')
-                                
-                                # Error check input
-                                while not all(card.isnumeric() and int(card) < len(server.players[0].hand) for card in choices.split()) or not verify_meld(decompose([server.players[0].hand[int(num)] for num in choices.split()])):
-                                    print('\nInvalid input')
-                                    choices = input('\n> ')
-                                
-                                meld = decompose([server.players[0].hand[int(num)] for num in choices.split()])
-                                
-                                # Removes melded cards from hand
-                                for meld_card in meld:
-                                    if meld_card in decompose(server.players[0].hand):
-                                        for card in server.players[0].hand:
-                                            if card.rank == meld_card[0] and card.suit == meld_card[1]:
-                                                server.players[0].hand.remove(card)
-                                                break
-                                
-                                # Add meld to melds
-                                server.players[0].melds.append(compose(meld))
-                                
-                                # Refresh display
-                                os.system('clear')
-                                host_display(server)
-                    
-                    # 3. Await candidates to submit any melds before submitting their hands.
-                    for i in candidates:
-                        if i == 0:
-                            continue
-                        
-                        message = await get_message(ret_val[i-1][0])
-                        
-                        if 'melds' in message:
-                            for meld in message['melds']:
-                                # Remove cards from player's hand
-                                for meld_card in meld:
-                                    if meld_card in decompose(server.players[i].hand):
-                                        for card in server.players[i].hand:
-                                            if card.rank == meld_card[0] and card.suit == meld_card[1]:
-                                                server.players[i].hand.remove(card)
-                                                break
-                                
-                                # Add meld to player's melds
-                                server.players[i].melds.append(compose(meld))
-                    
-                    # 4. Tally up the points.
-                    results = [(i, sum((card.points for card in server.players[i].hand))) for i in candidates]
-                    
-                    # 5. Compute the lowest score and filter out players with a higher score.
-                    top_score = min((r[1] for r in results))
-                    top_candidates = [r for r in results if r[1] == top_score]
-                    
-                    # 6. Break ties...
-                    if len(top_candidates) > 1:
-                        if server.last_draw in [candidate[0] for candidate in top_candidates]:
-                            winner = server.last_draw
-                        else:
-                            winner = server.order[1]
-                    
-                    # ...or simply declare the sole winner!
-                    else:
-                        winner = top_candidates[0][0]
+            host_display(server, broadcast.stragglers)
             
-            elif winner == -3:
-                # Draw procedure
-                # 
-                # 1. Check if host called Draw. If so, await their hand, then await any other hands. If not, prompt to challenge or fold.
-                challengers = list()
-                
-                # Host called Draw
-                if server.order[0] == 0:
-                    
-                    # Await their hand.
-                    choice = ''
-                    while choice != 's':
-                        print()
-                        
-                        # If host has any melds to expose
-                        if can_expose_meld := find_meld(decompose(server.players[0].hand)):
-                            print('0: Prepare a meld')
-                        else:
-                            print('s: Submit your hand')
-                        
-                        choice = input('\n> ')
-                        
-                        while (choice != '0' and choice != 's') or (choice == '0' and not can_expose_meld) or (choice == 's' and can_expose_meld):
-                            print('\nInvalid input')
-                            choice = input('\n> ')
-                        
-                        if choice == '0':
-                            # Display hand
-                            server.players[0].hand.sort(key=lambda x: x.suit)
-                            server.players[0].hand.sort(key=lambda x: Constants().RANKS.index(x.rank))
-                            print(f'{server.players[0].hand[0].rank.rjust(2)}{server.players[0].hand[0].suit}', end='')
-                            for i in range(1, len(server.players[0].hand)):
-                                print(f' {server.players[0].hand[i].rank.rjust(2)}{server.players[0].hand[i].suit}', end='')
-                            print()
-                            
-                            # Display enumeration for card select
-                            print('  0', end='')
-                            for i in range(1, len(server.players[0].hand)):
-                                print(f' {str(i).rjust(3)}', end='')
-                            print()
-                            
-                            print('\nChoose which cards you wish to meld (space-separated list of numbers)')
-                            
-                            choices = input('\n> ')
-                            
-                            # Error check input
-                            while not all(card.isnumeric() and int(card) < len(server.players[0].hand) for card in choices.split()) or not verify_meld(decompose([server.players[0].hand[int(num)] for num in choices.split()])):
-                                print('\nInvalid input')
-                                choices = input('\n> ')
-                            
-                            meld = decompose([server.players[0].hand[int(num)] for num in choices.split()])
-                            
-                            # Removes melded cards from hand
-                            for meld_card in meld:
-                                if meld_card in decompose(server.players[0].hand):
-                                    for card in server.players[0].hand:
-                                        if card.rank == meld_card[0] and card.suit == meld_card[1]:
-                                            server.players[0].hand.remove(card)
-                                            break
-                            
-                            # Add meld to melds
-                            server.players[0].melds.append(compose(meld))
-                            
-                            # Refresh display
-                            os.system('clear')
-                            host_display(server)
+            # Draw procedure: everyone but the player who called Draw challenges or folds in turn order, then the
+            # engine compares the hands of the caller and the challengers
+            while state.phase == RESPOND:
+                if to_move(state) == 0:
+                    actions = legal_actions(state)
                     
-                    challengers.append(0)
-                
-                # Client called Draw
-                else:
                     # Prompt to challenge or fold.
-                    if server.players[0].melds:
-                        print('c: Challenge')
+                    if ('challenge',) in actions:
+                        # Estimate the chance a challenge wins
+                        tracker.update_state(state)
+                        odds = await advise_draw(observe_state(state, 0, tracker))
+                        print(f'c: Challenge{describe_odds(odds, "challenge")}')
                     
                     print('f: Fold')
                     
                     choice = input('\n> ')
-                    while (choice != 'c' and choice != 'f') or (choice == 'c' and not server.players[0].melds):
+                    while (choice != 'c' and choice != 'f') or (choice == 'c' and ('challenge',) not in actions):
                         print('\nInvalid input')
                         choice = input('\n> ')
                     
-                    if choice == 'c':
-                        # Challenge: await host's hand
-                        choice = ''
-                        while choice != 's':
-                            print()
-                            
-                            # If host has any melds to expose
-                            if can_expose_meld := find_meld(decompose(server.players[0].hand)):
-                                print('0: Prepare a meld')
-                            else:
-                                print('s: Submit your hand')
-                            
-                            choice = input('\n> ')
-                            
-                            while (choice != '0' and choice != 's') or (choice == '0' and not can_expose_meld) or (choice == 's' and can_expose_meld):
-                                print('\nInvalid input')
-                                choice = input('\n> ')
-                            
-                            if choice == '0':
-                                # Display hand
-                                server.players[0].hand.sort(key=lambda x: x.suit)
-                                server.players[0].hand.sort(key=lambda x: Constants().RANKS.index(x.rank))
-                                print(f'{server.players[0].hand[0].rank.rjust(2)}{server.players[0].hand[0].suit}', end='')
-                                for i in range(1, len(server.players[0].hand)):
-                                    print(f' {server.players[0].hand[i].rank.rjust(2)}{server.players[0].hand[i].suit}', end='')
-                                print()
-                                
-                                # Display enumeration for card select
-                                print('  0', end='')
-                                for i in range(1, len(server.players[0].hand)):
-                                    print(f' {str(i).rjust(3)}', end='')
-                                print()
-                                
-                                print('\nChoose which cards you wish to meld (space-separated list of numbers)')
-                                
-                                choices = input('\n> ')
-                                
-                                # Error check input
-                                while not all(card.isnumeric() and int(card) < len(server.players[0].hand) for card in choices.split()) or not verify_meld(decompose([server.players[0].hand[int(num)] for num in choices.split()])):
-                                    print('\nInvalid input')
-                                    choices = input('\n> ')
-                                
-                                meld = decompose([server.players[0].hand[int(num)] for num in choices.split()])
-                                
-                                # Removes melded cards from hand
-                                for meld_card in meld:
-                                    if meld_card in decompose(server.players[0].hand):
-                                        for card in server.players[0].hand:
-                                            if card.rank == meld_card[0] and card.suit == meld_card[1]:
-                                                server.players[0].hand.remove(card)
-                                                break
-                                
-                                # Add meld to melds
-                                server.players[0].melds.append(compose(meld))
-                                
-                                # Refresh display
-                                os.system('clear')
-                                host_display(server)
-                        
-                        challengers.append(0)
-                    
-                # 2. Await hand(s)
-                for i in range(1, len(server.players)):
-                    if i == 0:
-                        continue
-                    
-                    message = await get_message(ret_val[i-1][0])
-                    
-                    if 'draw_response' in message and message['draw_response'] == 'challenge':
-                        challengers.append(i)
-                        
-                        if 'melds' in message:
-                            for meld in message['melds']:
-                                # Remove cards from player's hand
-                                for meld_card in meld:
-                                    if meld_card in decompose(server.players[i].hand):
-                                        for card in server.players[i].hand:
-                                            if card.rank == meld_card[0] and card.suit == meld_card[1]:
-                                                server.players[i].hand.remove(card)
-                                                break
-                                
-                                # Add meld to player's melds
-                                server.players[i].melds.append(compose(meld))
-                
-                # 3. Tally up the points.
-                results = [(i, sum((card.points for card in server.players[i].hand))) for i in challengers]
+                    action = ('challenge',) if choice == 'c' else ('fold',)
                 
-                # 4. Compute the lowest score and filter out players with a higher score.
-                top_score = min((r[1] for r in results))
-                top_challengers = [r for r in results if r[1] == top_score]
-                
-                # 5. Break ties...
-                if len(top_challengers) > 1:
-                    if (server.last_draw, top_score) in top_challengers:
-                        # Remove who called Draw from list of potential winners
-                        top_challengers.remove((server.last_draw, top_score))
-                        
-                        if len(top_challengers) > 1:
-                            winner = server.order[1]
-                        else:
-                            winner = top_challengers[0][0]
+                else:
+                    print(f'Waiting for {server.players[to_move(state)].name} to challenge or fold...')
                     
-                    else:
-                        winner = server.order[1]
+                    # Ignore anything but a response the rules allow
+                    action = parse_action(await streams[to_move(state)-1].receive())
+                    if action not in legal_actions(state):
+                        continue
                 
-                # ...or simply declare the sole winner!
-                else:
-                    winner = top_challengers[0][0]
+                state = apply(state, action)
+            
+            winner = state.winner
             
             if winner != -2:
                 server.players[winner].score += 1
             
             # Send final gamestate
-            await send_gamestate(ret_val, server, winner)
+            await send_gamestate(broadcast, server, winner)
             
             # Display final gamestate
             os.system('clear')
-            host_display(server)
+            host_display(server, broadcast.stragglers)
             
             # Print winner
             if winner != -2:
@@ -1042,20 +565,19 @@ async def main(state_info):
             
             print('\nAwaiting player responses...')
             
-            # Await rematch response
-            all_true = True
-            for i in range(1, len(server.players)):
-                response = await get_message(ret_val[i-1][0])
-                if response['command'] == 'rematch':
-                    if response['value'] != 1:
-                        all_true = False
-                        break
+            # Await every client's rematch response at once
+            responses = await asyncio.gather(*(streams[i-1].receive() for i in range(1, len(server.players))))
+            all_true = all(response['command'] != 'rematch' or response['value'] == 1 for response in responses)
             
             if not all_true:
                 break
             
             # Reset server but save score!
             server.reset(ret_val, winner)
+        
+        # No more rounds to deal or messages to read
+        server.close()
+        broadcast.close()
     
     
     # Client
@@ -1064,6 +586,15 @@ async def main(state_info):
         # To verify initial game attendance
         await send_message(ret_val[1], {'command': 'lol'})
         
+        # Your hand, with its melds, outs and deadwood kept up to date between gamestates
+        hand = HandState()
+        
+        # The cards you have seen
+        tracker = CardTracker()
+        
+        # Your view of the game, kept up to date from the host's state stream
+        mirror = StateMirror(ret_val[0], ret_val[1])
+        
         # Game lobby loop
         while True:
             
@@ -1073,11 +604,8 @@ async def main(state_info):
             # Gameplay loop
             while gamestate['winner'] == -1:
                 
-                # Await gamestate
-                gamestate = await get_message(ret_val[0])
-                
-                # Get player info
-                players = [await get_message(ret_val[0]) for _ in range(0, len(gamestate['order']))]
+                # Await gamestate and player info
+                gamestate, players = await get_gamestate(mirror, hand, tracker)
                 
                 # Display game state
                 os.system('clear')
@@ -1087,11 +615,8 @@ async def main(state_info):
                 while gamestate['order'][0] != gamestate['id'] and gamestate['winner'] == -1:
                     print(f'{players[gamestate["order"][0]]["name"]}\'s turn...')
                     
-                    # Await gamestate
-                    gamestate = await get_message(ret_val[0])
-                    
-                    # Get player info
-                    players = [await get_message(ret_val[0]) for _ in range(0, len(gamestate['order']))]
+                    # Await gamestate and player info
+                    gamestate, players = await get_gamestate(mirror, hand, tracker)
                     
                     # Redraw display
                     os.system('clear')
@@ -1101,21 +626,29 @@ async def main(state_info):
                     break
                 
                 # Client's turn
+                # Everything the rules allow you to do now
+                view = observe(gamestate, players, PICK, tracker)
+                actions = legal_actions(view.state)
+                
+                # Melds you can expose with the top card of the discard
+                picks = [action for action in actions if action[0] == 'pick_discard']
+                
                 # Display option to pick up from deck
                 print('0: Pick up a card from the top of the deck')
                 
                 # Check if player can pick up from discard
-                if gamestate['discard']:
-                    if can_pick_discard := find_meld(players[gamestate['id']]['hand'] + [gamestate['discard'][-1]], gamestate['discard'][-1]):
-                        print('1: Pick up a card from the top of the discard to expose a meld')
+                if picks:
+                    print('1: Pick up a card from the top of the discard to expose a meld')
                 
-                # Display option to draw if player can TODO: VERIFY
-                if players[gamestate['id']]['can_draw']:
-                    print('2: Call draw')
+                # Display option to draw if player can
+                if ('draw',) in actions:
+                    # Estimate the chance the draw wins
+                    odds = await advise_draw(view)
+                    print(f'2: Call draw{describe_odds(odds, "draw")}')
                 
                 # Get player's choice
                 choice = input('\n> ')
-                while not choice.isnumeric() or int(choice) > 2 or (int(choice) == 1 and not can_pick_discard) or (int(choice) == 2 and not players[gamestate['id']]['can_draw']):
+                while not choice.isnumeric() or int(choice) > 2 or (int(choice) == 1 and not picks) or (int(choice) == 2 and ('draw',) not in actions):
                     print('\nInvalid input')
                     choice = input('\n> ')
                 
@@ -1126,8 +659,7 @@ async def main(state_info):
                 
                 elif choice == '1':
                     # Display hand
-                    players[gamestate['id']]['hand'].sort(key=lambda x: x[1])
-                    players[gamestate['id']]['hand'].sort(key=lambda x: Constants().RANKS.index(x[0]))
+                    players[gamestate['id']]['hand'].sort(key=lambda x: CONSTANTS.CARD_ORDER[(x[0], x[1])])
                     print(f'{players[gamestate["id"]]["hand"][0][0].rjust(2)}{players[gamestate["id"]]["hand"][0][1]}', end='')
                     for i in range(1, len(players[gamestate["id"]]["hand"])):
                         print(f' {players[gamestate["id"]]["hand"][i][0].rjust(2)}{players[gamestate["id"]]["hand"][i][1]}', end='')
@@ -1141,12 +673,15 @@ async def main(state_info):
                     
                     print('\nChoose which cards you wish to meld (space-separated list of numbers)')
                     
-                    choices = input('\n> ')
+                    # Offer the first meld found as the default
+                    suggestion = offer_meld(players[gamestate['id']]['hand'], picks[0][1])
+                    
+                    choices = input('\n> ') or suggestion
                     
                     # Verify input
-                    while not all(choice.isnumeric() and int(choice) < len(players[gamestate['id']]['hand']) for choice in choices.split()) or not verify_meld([players[gamestate['id']]['hand'][int(num)] for num in choices.split()] + [gamestate['discard'][-1]]):
+                    while not all(choice.isnumeric() and int(choice) < len(players[gamestate['id']]['hand']) for choice in choices.split()) or ('pick_discard', hand_mask(players[gamestate['id']]['hand'][int(num)] for num in choices.split())) not in picks:
                         print('\nInvalid input')
-                        choices = input('\n> ')
+                        choices = input('\n> ') or suggestion
                     
                     meld = [players[gamestate['id']]['hand'][int(num)] for num in choices.split()]
                     
@@ -1157,11 +692,8 @@ async def main(state_info):
                     await send_message(ret_val[1], {'command': 'draw'})
                 
                 while gamestate['order'][0] == gamestate['id']:
-                    # Await gamestate
-                    gamestate = await get_message(ret_val[0])
-                    
-                    # Get player info
-                    players = [await get_message(ret_val[0]) for _ in range(0, len(gamestate['order']))]
+                    # Await gamestate and player info
+                    gamestate, players = await get_gamestate(mirror, hand, tracker)
                     
                     # Display game state
                     os.system('clear')
@@ -1170,39 +702,33 @@ async def main(state_info):
                     if gamestate['winner'] != -1:
                         break
                     
+                    # Everything the rules allow you to do now
+                    view = observe(gamestate, players, PLAY, tracker)
+                    actions = legal_actions(view.state)
+                    
+                    # Melds you can expose, and the cards you can lay off on exposed melds
+                    exposes = [action for action in actions if action[0] == 'expose']
+                    lay_offs = [action for action in actions if action[0] == 'lay_off']
+                    
                     # Check if you have a valid meld to play
-                    if can_expose_meld := find_meld(players[gamestate['id']]['hand']):
+                    if exposes:
                         print('0: Expose a meld')
                     
                     # If can lay off
-                    can_lay_off = False
-                    for player in players:
-                        if player['melds']:
-                            for meld in player['melds']:
-                                for card in players[gamestate['id']]['hand']:
-                                    if find_meld(meld + [card], card):
-                                        can_lay_off = True
-                                        break
-                                if can_lay_off:
-                                    break
-                        if can_lay_off:
-                            break
-                    
-                    if can_lay_off:
+                    if lay_offs:
                         print('l: Lay off a card')
                     
                     print('d: Discard a card')
                     
                     choice = input('\n> ')
                     
-                    while (choice != '0' and choice != 'l' and choice != 'd') or (choice == '0' and not can_expose_meld) or (choice == 'l' and not can_lay_off):
+                    while (choice != '0' and choice != 'l' and choice != 'd') or (choice == '0' and not exposes) or (choice == 'l' and not lay_offs):
                         print('\nInvalid input')
                         choice = input('\n> ')
                     
                     if choice == '0':
                         # Display hand
-                        players[gamestate['id']]['hand'].sort(key=lambda x: x[1])
-                        players[gamestate['id']]['hand'].sort(key=lambda x: Constants().RANKS.index(x[0]))
+                        players[gamestate['id']]['hand'].sort(key=lambda x: CONSTANTS.CARD_ORDER[(x[0], x[1])])
                         print(f'{players[gamestate["id"]]["hand"][0][0].rjust(2)}{players[gamestate["id"]]["hand"][0][1]}', end='')
                         for i in range(1, len(players[gamestate["id"]]["hand"])):
                             print(f' {players[gamestate["id"]]["hand"][i][0].rjust(2)}{players[gamestate["id"]]["hand"][i][1]}', end='')
@@ -1216,11 +742,14 @@ async def main(state_info):
                         
                         print('\nChoose which cards you wish to meld (space-separated list of numbers)')
                         
-                        choices = input('\n> ')
+                        # Offer the first meld found as the default
+                        suggestion = offer_meld(players[gamestate['id']]['hand'], exposes[0][1])
+                        
+                        choices = input('\n> ') or suggestion
                         
-                        while not all(choice.isnumeric() and int(choice) < len(players[gamestate['id']]['hand']) for choice in choices.split()) or not verify_meld([players[gamestate['id']]['hand'][int(num)] for num in choices.split()]):
+                        while not all(choice.isnumeric() and int(choice) < len(players[gamestate['id']]['hand']) for choice in choices.split()) or ('expose', hand_mask(players[gamestate['id']]['hand'][int(num)] for num in choices.split())) not in exposes:
                             print('\nInvalid input')
-                            choices = input('\n> ')
+                            choices = input('\n> ') or suggestion
                         
                         meld = [players[gamestate['id']]['hand'][int(num)] for num in choices.split()]
                         
@@ -1230,8 +759,7 @@ async def main(state_info):
                     # LAY OFF
                     elif choice == 'l':
                         # Display hand
-                        players[gamestate['id']]['hand'].sort(key=lambda x: x[1])
-                        players[gamestate['id']]['hand'].sort(key=lambda x: Constants().RANKS.index(x[0]))
+                        players[gamestate['id']]['hand'].sort(key=lambda x: CONSTANTS.CARD_ORDER[(x[0], x[1])])
                         print(f'{players[gamestate["id"]]["hand"][0][0].rjust(2)}{players[gamestate["id"]]["hand"][0][1]}', end='')
                         for i in range(1, len(players[gamestate['id']]['hand'])):
                             print(f' {players[gamestate["id"]]["hand"][i][0].rjust(2)}{players[gamestate["id"]]["hand"][i][1]}', end='')
@@ -1247,40 +775,21 @@ async def main(state_info):
                         
                         choice = input('\n> ')
                         
-                        melds = [meld for player in players if player['melds'] for meld in player['melds']]
-                        
-                        valid_input = choice.isnumeric() and int(choice) < len(players[gamestate['id']]['hand']) and not all(not find_meld(meld + [players[gamestate['id']]['hand'][int(choice)]], players[gamestate['id']]['hand'][int(choice)]) for meld in melds)
-                        
                         # Verify input
-                        while not valid_input:
+                        while not choice.isnumeric() or int(choice) >= len(players[gamestate['id']]['hand']) or not any(lay_off[1] == card_index(players[gamestate['id']]['hand'][int(choice)]) for lay_off in lay_offs):
                             print('\nInvalid input')
                             choice = input('\n> ')
-                            
-                            valid_input = choice.isnumeric() and int(choice) < len(players[gamestate['id']]['hand']) and not all(not find_meld(meld + [players[gamestate['id']]['hand'][int(choice)]], players[gamestate['id']]['hand'][int(choice)]) for meld in melds)
                         
                         # Compile viable melds
-                        melds = list()
-                        player_ids = list()
-                        id_num = 0
-                        meld_ids = list()
-                        for player in players:
-                            if player['melds']:
-                                meld_num = 0
-                                for meld in player['melds']:
-                                    if find_meld(meld + [players[gamestate['id']]['hand'][int(choice)]], players[gamestate['id']]['hand'][int(choice)]):
-                                        melds.append(meld)
-                                        player_ids.append(id_num)
-                                        meld_ids.append(meld_num)
-                                    meld_num += 1
-                            id_num += 1
+                        targets = [lay_off for lay_off in lay_offs if lay_off[1] == card_index(players[gamestate['id']]['hand'][int(choice)])]
                         
                         meld_choice = None
-                        if len(melds) > 1:
+                        if len(targets) > 1:
                             # Display melds
                             num_meld = 0
-                            for meld in melds:
-                                meld.sort(key=lambda x: x[1])
-                                meld.sort(key=lambda x: Constants().RANKS.index(x[0]))
+                            for target in targets:
+                                meld = players[target[2]]['melds'][target[3]]
+                                meld.sort(key=lambda x: CONSTANTS.CARD_ORDER[(x[0], x[1])])
                                 print(f'{num_meld}: {meld[0][0].rjust(2)}{meld[0][1]}', end='')
                                 for j in range(1, len(meld)):
                                     print(f'{meld[j][0].rjust(2)}{meld[j][1]}', end='')
@@ -1291,7 +800,7 @@ async def main(state_info):
                             print('Choose which meld you wish to lay off on')
                             meld_choice = input('\n> ')
                             
-                            while not meld_choice.isnumeric() or int(meld_choice) >= len(melds):
+                            while not meld_choice.isnumeric() or int(meld_choice) >= len(targets):
                                 print('\nInvalid input')
                                 meld_choice = input('\n> ')
                             
@@ -1301,13 +810,12 @@ async def main(state_info):
                             meld_choice = 0
                         
                         # Lay off card
-                        await send_message(ret_val[1], {'command': 'lay_off', 'card': players[gamestate['id']]['hand'][int(choice)], 'player_id': player_ids[meld_choice], 'meld_id': meld_ids[meld_choice]})
-                        
-                        
+                        await send_message(ret_val[1], {'command': 'lay_off', 'card': players[gamestate['id']]['hand'][int(choice)], 'player_id': targets[meld_choice][2], 'meld_id': targets[meld_choice][3]})
+                    
+                    
                     elif choice == 'd':
                         # Display hand
-                        players[gamestate['id']]['hand'].sort(key=lambda x: x[1])
-                        players[gamestate['id']]['hand'].sort(key=lambda x: Constants().RANKS.index(x[0]))
+                        players[gamestate['id']]['hand'].sort(key=lambda x: CONSTANTS.CARD_ORDER[(x[0], x[1])])
                         print(f'{players[gamestate["id"]]["hand"][0][0].rjust(2)}{players[gamestate["id"]]["hand"][0][1]}', end='')
                         for i in range(1, len(players[gamestate['id']]['hand'])):
                             print(f' {players[gamestate["id"]]["hand"][i][0].rjust(2)}{players[gamestate["id"]]["hand"][i][1]}', end='')
@@ -1321,11 +829,16 @@ async def main(state_info):
                         
                         print('\nChoose which card you wish to discard')
                         
-                        choice = input('\n> ')
+                        # Offer the discard that leaves the fewest points for the least risk of the next player picking it up
+                        best = rank_discards(view)[0]
+                        suggestion = str([card_index(card) for card in players[gamestate['id']]['hand']].index(best[0]))
+                        print(f'(Press enter to discard {CARDS[best[0]]}: {describe_discard(best, players[gamestate["order"][1]]["name"])})')
+                        
+                        choice = input('\n> ') or suggestion
                         
                         while not choice.isnumeric() or int(choice) >= len(players[gamestate['id']]['hand']):
                             print('\nInvalid input')
-                            choice = input('\n> ')
+                            choice = input('\n> ') or suggestion
                         
                         # Discard card
                         await send_message(ret_val[1], {'command': 'discard', 'card': players[gamestate['id']]['hand'][int(choice)]})
@@ -1337,144 +850,26 @@ async def main(state_info):
             
             # Client game ended ############################
             
-            # If winner == -2, then the deck was exhausted.
-            # If winner == -3, then server.order[0] called Draw.
-            # Otherwise, winner is the winner.
+            # If winner == -3, then gamestate['order'][0] called Draw.
+            # Otherwise, winner is the winner, or -2 if the deck was exhausted before anyone exposed a meld.
+            # The host tallies the hands, so only a called draw needs an answer.
             
-            if gamestate['winner'] == -2:
-                if players[gamestate['id']]['melds']:
-                    melds = list()
-                    
-                    # Await hand.
-                    choice = ''
-                    while choice != 's':
-                        print()
-                        
-                        # If you have any melds to expose
-                        if can_expose_meld := find_meld(players[gamestate['id']]['hand']):
-                            print('0: Prepare a meld')
-                        else:
-                            print('s: Submit your hand')
-                        
-                        choice = input('\n> ')
-                        
-                        while (choice != '0' and choice != 's') or (choice == '0' and not can_expose_meld) or (choice == 's' and can_expose_meld):
-                            print('\nInvalid input')
-                            choice = input('\n> ')
-                        
-                        if choice == '0':
-                            # Display hand
-                            players[gamestate['id']]['hand'].sort(key=lambda x: x[1])
-                            players[gamestate['id']]['hand'].sort(key=lambda x: Constants().RANKS.index(x[0]))
-                            print(f'{players[gamestate["id"]]["hand"][0][0].rjust(2)}{players[gamestate["id"]]["hand"][0][1]}', end='')
-                            for i in range(1, len(players[gamestate["id"]]["hand"])):
-                                print(f' {players[gamestate["id"]]["hand"][i][0].rjust(2)}{players[gamestate["id"]]["hand"][i][1]}', end='')
-                            print()
-                            
-                            # Display enumeration for card select
-                            print('  0', end='')
-                            for i in range(1, len(players[gamestate['id']]['hand'])):
-                                print(f' {str(i).rjust(3)}', end='')
-                            print()
-                            
-                            print('\nChoose which cards you wish to meld (space-separated list of numbers)')
-                            
-                            choices = input('\n> ')
-                            
-                            while not all(choice.isnumeric() and int(choice) < len(players[gamestate['id']]['hand']) for choice in choices.split()) or not verify_meld([players[gamestate['id']]['hand'][int(num)] for num in choices.split()]):
-                                print('\nInvalid input')
-                                choices = input('\n> ')
-                            
-                            meld = [players[gamestate['id']]['hand'][int(num)] for num in choices.split()]
-                            
-                            melds.append(meld)
-                            
-                            # Remove cards from player's hand
-                            for meld_card in meld:
-                                players[gamestate['id']]['hand'].remove(meld_card)
-                            
-                            # Add meld to player's melds
-                            players[gamestate['id']]['melds'].append(meld)
-                            
-                            # Refresh display
-                            os.system('clear')
-                            client_display(gamestate, players)
-                    
-                    # Send melds to host
-                    await send_message(ret_val[1], {'melds': melds})
-            
-            elif gamestate['winner'] == -3:
+            if gamestate['winner'] == -3:
                 # Draw procedure
                 # 
-                # 1. Check if you called Draw. If so, await your hand. If not, prompt to challenge or fold.
+                # 1. Check if you called Draw. If so, await the others. If not, prompt to challenge or fold.
                 
                 # You called Draw
                 if gamestate['order'][0] == gamestate['id']:
-                    melds = list()
-                    
-                    # Await your hand.
-                    choice = ''
-                    while choice != 's':
-                        print()
-                        
-                        # If you have any melds to expose
-                        if can_expose_meld := find_meld(players[gamestate['id']]['hand']):
-                            print('0: Prepare a meld')
-                        else:
-                            print('s: Submit your hand')
-                        
-                        choice = input('\n> ')
-                        
-                        while (choice != '0' and choice != 's') or (choice == '0' and not can_expose_meld) or (choice == 's' and can_expose_meld):
-                            print('\nInvalid input')
-                            choice = input('\n> ')
-                        
-                        if choice == '0':
-                            # Display hand
-                            players[gamestate['id']]['hand'].sort(key=lambda x: x[1])
-                            players[gamestate['id']]['hand'].sort(key=lambda x: Constants().RANKS.index(x[0]))
-                            print(f'{players[gamestate["id"]]["hand"][0][0].rjust(2)}{players[gamestate["id"]]["hand"][0][1]}', end='')
-                            for i in range(1, len(players[gamestate["id"]]["hand"])):
-                                print(f' {players[gamestate["id"]]["hand"][i][0].rjust(2)}{players[gamestate["id"]]["hand"][i][1]}', end='')
-                            print()
-                            
-                            # Display enumeration for card select
-                            print('  0', end='')
-                            for i in range(1, len(players[gamestate['id']]['hand'])):
-                                print(f' {str(i).rjust(3)}', end='')
-                            print()
-                            
-                            print('\nChoose which cards you wish to meld (space-separated list of numbers)')
-                            
-                            choices = input('\n> ')
-                            
-                            while not all(choice.isnumeric() and int(choice) < len(players[gamestate['id']]['hand']) for choice in choices.split()) or not verify_meld([players[gamestate['id']]['hand'][int(num)] for num in choices.split()]):
-                                print('\nInvalid input')
-                                choices = input('\n> ')
-                            
-                            meld = [players[gamestate['id']]['hand'][int(num)] for num in choices.split()]
-                            
-                            melds.append(meld)
-                            
-                            # Remove cards from player's hand
-                            for meld_card in meld:
-                                players[gamestate['id']]['hand'].remove(meld_card)
-                            
-                            # Add meld to player's melds
-                            players[gamestate['id']]['melds'].append(meld)
-                            
-                            # Refresh display
-                            os.system('clear')
-                            client_display(gamestate, players)
-                    
-                    # Obv ur not challenging cuz u called the Draw, but host doesn't know that, so this is a little hack
-                    await send_message(ret_val[1], {'draw_response': 'challenge', 'melds': melds})
+                    print('Waiting for the other players to challenge or fold...')
                 
                 # Someone else called Draw
                 else:
                     # Prompt to challenge or fold.
                     if players[gamestate['id']]['melds']:
-                        print('c: Challenge')
+                        # Estimate the chance a challenge wins
+                        odds = await advise_draw(observe(gamestate, players, tracker=tracker))
+                        print(f'c: Challenge{describe_odds(odds, "challenge")}')
                     
                     print('f: Fold')
                     
@@ -1487,70 +882,10 @@ async def main(state_info):
                         await send_message(ret_val[1], {'draw_response': 'fold'})
                     
                     elif choice == 'c':
-                        melds = list()
-                        
-                        # Challenge: await host's hand
-                        choice = ''
-                        while choice != 's':
-                            print()
-                            
-                            # If you have any melds to expose
-                            if can_expose_meld := find_meld(players[gamestate['id']]['hand']):
-                                print('0: Prepare a meld')
-                            else:
-                                print('s: Submit your hand')
-                            
-                            choice = input('\n> ')
-                            
-                            while (choice != '0' and choice != 's') or (choice == '0' and not can_expose_meld) or (choice == 's' and can_expose_meld):
-                                print('\nInvalid input')
-                                choice = input('\n> ')
-                            
-                            if choice == '0':
-                                # Display hand
-                                players[gamestate['id']]['hand'].sort(key=lambda x: x[1])
-                                players[gamestate['id']]['hand'].sort(key=lambda x: Constants().RANKS.index(x[0]))
-                                print(f'{players[gamestate["id"]]["hand"][0][0].rjust(2)}{players[gamestate["id"]]["hand"][0][1]}', end='')
-                                for i in range(1, len(players[gamestate["id"]]["hand"])):
-                                    print(f' {players[gamestate["id"]]["hand"][i][0].rjust(2)}{players[gamestate["id"]]["hand"][i][1]}', end='')
-                                print()
-                                
-                                # Display enumeration for card select
-                                print('  0', end='')
-                                for i in range(1, len(players[gamestate['id']]['hand'])):
-                                    print(f' {str(i).rjust(3)}', end='')
-                                print()
-                                
-                                print('\nChoose which cards you wish to meld (space-separated list of numbers)')
-                                
-                                choices = input('\n> ')
-                                
-                                while not all(choice.isnumeric() and int(choice) < len(players[gamestate['id']]['hand']) for choice in choices.split()) or not verify_meld([players[gamestate['id']]['hand'][int(num)] for num in choices.split()]):
-                                    print('\nInvalid input')
-                                    choices = input('\n> ')
-                                
-                                meld = [players[gamestate['id']]['hand'][int(num)] for num in choices.split()]
-                                
-                                melds.append(meld)
-                                
-                                # Remove cards from player's hand
-                                for meld_card in meld:
-                                    players[gamestate['id']]['hand'].remove(meld_card)
-                                
-                                # Add meld to player's melds
-                                players[gamestate['id']]['melds'].append(meld)
-                                
-                                # Refresh display
-                                os.system('clear')
-                                client_display(gamestate, players)
-                    
-                        await send_message(ret_val[1], {'draw_response': 'challenge', 'melds': melds})
-            
-            # Await final gamestate
-            gamestate = await get_message(ret_val[0])
+                        await send_message(ret_val[1], {'draw_response': 'challenge'})
             
-            # Get final player info
-            players = [await get_message(ret_val[0]) for _ in range(0, len(gamestate['order']))]
+            # Await final gamestate and player info
+            gamestate, players = await get_gamestate(mirror, hand, tracker)
             
             # Display game state
             os.system('clear')
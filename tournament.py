@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# tournament.py
+
+# To parse command line options
+import argparse
+
+# To run games on every core
+import concurrent.futures
+import os
+
+# To read and write checkpoints
+import json
+
+# To seed deals and strategies, and to resample deals
+import random
+import secrets
+
+# To give each decision a time budget
+import time
+
+# To convert strengths to Elo ratings
+import math
+
+# The headless game engine
+import engine
+
+# To give every deal its own recorded seed
+from deal import Dealer
+
+# The bots' default time budget
+from config import SETTINGS
+
+# Strategies that play the seats, and the view each seat has of a game
+from bot import STRATEGIES, ISMCTSStrategy, observe_state
+
+# To track the cards each seat has seen
+from tracker import CardTracker
+
+# Name of the file in a checkpoint directory that records what the tournament is
+CONFIG_FILE = 'tournament.json'
+
+
+# Returns the strategy a spec names: a strategy name, optionally followed by keyword options as JSON values
+# (e.g. 'ismcts:iterations=400,exploration=0.5')
+def make_strategy(spec, rng, budget):
+    name, _, options = spec.partition(':')
+    if name not in STRATEGIES:
+        raise ValueError(f'unknown strategy {name!r}')
+    
+    kwargs = dict()
+    for option in options.split(',') if options else []:
+        key, _, value = option.partition('=')
+        kwargs[key] = json.loads(value)
+    
+    # Each game already runs in its own worker process
+    if issubclass(STRATEGIES[name], ISMCTSStrategy):
+        kwargs.setdefault('workers', 1)
+    
+    return STRATEGIES[name](rng, budget, **kwargs)
+
+
+# Returns every lineup of strategies (one per seat, in starting turn order) with at least two different strategies.
+# A spec listed twice is seated once, so its lineups do not count twice in the ratings.
+def lineups(specs, num_players=3):
+    specs = list(dict.fromkeys(specs))
+    seatings = [()]
+    for _ in range(num_players):
+        seatings = [seating + (spec,) for seating in seatings for spec in specs]
+    
+    return [seating for seating in seatings if len(set(seating)) > 1]
+
+
+# Plays a deal to the end; seat i (i-th in the starting turn order) is played by lineup[i]. Every lineup of a deal
+# is dealt the same cards, so the luck of the deal cancels out when strategies are compared.
+def play_game(lineup, deal_seed, budget):
+    state = engine.new_game(rng=random.Random(deal_seed))
+    seats = {player: seat for seat, player in enumerate(state.order)}
+    strategies = [make_strategy(lineup[seat], random.Random(f'{deal_seed}:{seat}'), budget) for seat in range(len(lineup))]
+    trackers = [CardTracker(player, len(state.hands)) for player in range(len(state.hands))]
+    
+    while state.phase != engine.OVER:
+        player = engine.to_move(state)
+        trackers[player].update_state(state)
+        strategy = strategies[seats[player]]
+        action = strategy.choose(observe_state(state, player, trackers[player]), engine.legal_actions(state), time.monotonic() + strategy.budget)
+        state = engine.apply(state, action)
+    
+    return state, seats
+
+
+# Plays a batch of (deal, deal_seed, lineup) games in a worker process, appending each result to the worker's
+# checkpoint file as soon as it is known, and returns the results
+def run_batch(directory, games, budget):
+    results = list()
+    with open(os.path.join(directory, f'worker-{os.getpid()}.jsonl'), 'a') as checkpoint:
+        for deal, deal_seed, lineup in games:
+            state, seats = play_game(lineup, deal_seed, budget)
+            
+            result = {
+                'deal'      : deal,
+                'lineup'    : list(lineup),
+                'winner'    : seats[state.winner] if state.winner != engine.NOBODY else None,
+                'reason'    : state.reason,
+                'turns'     : state.turns
+            }
+            checkpoint.write(json.dumps(result) + '\n')
+            checkpoint.flush()
+            results.append(result)
+    
+    return results
+
+
+# Returns the results recorded in a checkpoint directory, dropping a line cut off by an interrupted run
+def load_results(directory):
+    results = dict()
+    for file_name in sorted(os.listdir(directory)):
+        if not file_name.endswith('.jsonl'):
+            continue
+        
+        with open(os.path.join(directory, file_name), 'r+') as checkpoint:
+            data = checkpoint.read()
+            if data and not data.endswith('\n'):
+                data = data[:data.rfind('\n') + 1]
+                checkpoint.seek(0)
+                checkpoint.truncate()
+                checkpoint.write(data)
+        
+        for line in data.splitlines():
+            result = json.loads(line)
+            results.setdefault((result['deal'], tuple(result['lineup'])), result)
+    
+    return results
+
+
+# Returns the tournament recorded in a checkpoint directory, recording it first if the directory is new. A directory
+# can only be resumed (or extended with more deals) by the same strategies, seed and budget.
+def load_config(directory, specs, seed, budget):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, CONFIG_FILE)
+    
+    if os.path.exists(path):
+        with open(path) as config_file:
+            config = json.load(config_file)
+        
+        if config['strategies'] != list(specs) or seed not in (None, config['seed']) or budget not in (None, config['budget']):
+            raise ValueError(f'{directory} holds a different tournament: {config}')
+        
+        return config
+    
+    config = {
+        'strategies'    : list(specs),
+        'seed'          : seed if seed != None else secrets.randbits(64),
+        'budget'        : budget if budget != None else SETTINGS.BOT_BUDGET
+    }
+    with open(path, 'w') as config_file:
+        json.dump(config, config_file)
+    
+    return config
+
+
+# Plays every lineup on each of num_deals seeded deals across a process pool, skipping the games already in the
+# checkpoint directory, and yields the results of each batch as it finishes
+def tournament(directory, specs, num_deals, workers=None, batch_size=50, seed=None, budget=None):
+    # Fail on a bad spec before any worker starts
+    for spec in specs:
+        make_strategy(spec, None, budget)
+    
+    config = load_config(directory, specs, seed, budget)
+    done = load_results(directory)
+    
+    dealer = Dealer(config['seed'])
+    games = list()
+    for deal in range(num_deals):
+        deal_seed = dealer.next_round().getrandbits(64)
+        for lineup in lineups(config['strategies']):
+            if (deal, lineup) not in done:
+                games.append((deal, deal_seed, lineup))
+    
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_batch, directory, games[start:start + batch_size], config['budget']) for start in range(0, len(games), batch_size)]
+        for future in concurrent.futures.as_completed(futures):
+            yield future.result()
+
+
+# Returns pairwise wins, {(winner, loser): count}, counting a win over every seat of another strategy at the table
+def pairwise_wins(results):
+    wins = dict()
+    for result in results:
+        if result['winner'] == None:
+            continue
+        
+        winner = result['lineup'][result['winner']]
+        for loser in result['lineup']:
+            if loser != winner:
+                wins[(winner, loser)] = wins.get((winner, loser), 0) + 1
+    
+    return wins
+
+
+# Returns the Elo rating of each strategy (averaging 0) fitted to pairwise wins by maximum likelihood under the
+# Bradley-Terry model. Each pair that met gets half a win both ways, so a strategy that never won still has a rating.
+def fit_elo(wins, specs, rounds=100):
+    meetings = {(a, b): wins.get((a, b), 0) + wins.get((b, a), 0) + 1 for a in specs for b in specs if a != b}
+    meetings = {pair: count for pair, count in meetings.items() if count > 1}
+    won = {a: sum(wins.get((a, b), 0) + 0.5 for b in specs if (a, b) in meetings) for a in specs}
+    
+    # Minorization-maximization updates, renormalized to a geometric mean of 1
+    strength = {a: 1.0 for a in specs}
+    for _ in range(rounds):
+        for a in specs:
+            games = sum(meetings[(a, b)] / (strength[a] + strength[b]) for b in specs if (a, b) in meetings)
+            if games:
+                strength[a] = won[a] / games
+        
+        mean = sum(math.log(strength[a]) for a in specs) / len(specs)
+        strength = {a: strength[a] / math.exp(mean) for a in specs}
+    
+    return {a: 400 * math.log10(strength[a]) for a in specs}
+
+
+# Returns the Elo ratings and their confidence intervals, {strategy: (elo, low, high)}, resampling whole deals
+# (every lineup of a deal shares its cards) to find the intervals. Deals are taken in order, so the same results
+# and seed give the same intervals however the results were recorded.
+def rate(results, specs, resamples=200, confidence=0.95, seed=None):
+    by_deal = dict()
+    for result in sorted(results, key=lambda result: (result['deal'], result['lineup'])):
+        by_deal.setdefault(result['deal'], list()).append(result)
+    
+    deal_wins = [pairwise_wins(games) for games in by_deal.values()]
+    elo = fit_elo(pairwise_wins(results), specs)
+    
+    rng = random.Random(seed)
+    samples = {a: list() for a in specs}
+    for _ in range(resamples):
+        wins = dict()
+        for deal in rng.choices(deal_wins, k=len(deal_wins)):
+            for pair in deal:
+                wins[pair] = wins.get(pair, 0) + deal[pair]
+        
+        sample = fit_elo(wins, specs)
+        for a in specs:
+            samples[a].append(sample[a])
+    
+    ratings = dict()
+    for a in specs:
+        ordered = sorted(samples[a])
+        low = ordered[int((1 - confidence) / 2 * (len(ordered) - 1))] if ordered else elo[a]
+        high = ordered[int((1 + confidence) / 2 * (len(ordered) - 1))] if ordered else elo[a]
+        ratings[a] = (elo[a], low, high)
+    
+    return ratings
+
+
+# Prints the ratings, best first, with each strategy's games and win rate (seed is the tournament's, so a report
+# of the same games is the same every time)
+def report(results, specs, resamples=200, seed=None):
+    games = {a: 0 for a in specs}
+    won = {a: 0 for a in specs}
+    for result in results:
+        for seat, spec in enumerate(result['lineup']):
+            games[spec] += 1
+            won[spec] += result['winner'] == seat
+    
+    deals = len(set(result['deal'] for result in results))
+    nobody = sum(result['winner'] == None for result in results)
+    print(f'Games: {len(results)} ({deals} deals), nobody won: {nobody}')
+    
+    ratings = rate(results, specs, resamples, seed=seed)
+    width = max(len(spec) for spec in specs)
+    print(f'{"Strategy":<{width}}  {"Elo":>6}  {"95% CI":>16}  {"Seats":>7}  Win rate')
+    for spec in sorted(specs, key=lambda spec: -ratings[spec][0]):
+        elo, low, high = ratings[spec]
+        print(f'{spec:<{width}}  {elo:>+6.0f}  [{low:>+6.0f}, {high:>+6.0f}]  {games[spec]:>7}  {won[spec] / games[spec] if games[spec] else 0:.4f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play bot strategies against each other in every seat order and rate them')
+    parser.add_argument('strategies', nargs='+', metavar='STRATEGY', help=f'{", ".join(sorted(STRATEGIES))}, optionally with options (e.g. ismcts:iterations=400)')
+    parser.add_argument('-n', '--deals', type=int, default=1000, help='deals, each played by every lineup')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count())
+    parser.add_argument('-b', '--batch-size', type=int, default=50)
+    parser.add_argument('-s', '--seed', type=int, default=None)
+    parser.add_argument('-t', '--budget', type=float, default=None, help='seconds per decision')
+    parser.add_argument('-o', '--checkpoint', default='tournament', help='directory to record results in and resume from')
+    parser.add_argument('-r', '--resamples', type=int, default=200, help='deal resamples for the confidence intervals')
+    args = parser.parse_args()
+    args.strategies = list(dict.fromkeys(args.strategies))
+    
+    if len(args.strategies) < 2:
+        parser.error('a tournament needs at least two different strategies')
+    
+    total = args.deals * len(lineups(args.strategies))
+    played = 0
+    try:
+        for results in tournament(args.checkpoint, args.strategies, args.deals, args.workers, args.batch_size, args.seed, args.budget):
+            played += len(results)
+            print(f'\r{played} games played, {total} in the tournament', end='', flush=True)
+        print('\n')
+    
+    except ValueError as error:
+        parser.error(str(error))
+    
+    # Rate every recorded game of the requested deals, including those played before a resume
+    config = load_config(args.checkpoint, args.strategies, args.seed, args.budget)
+    results = [result for result in load_results(args.checkpoint).values() if result['deal'] < args.deals]
+    report(results, args.strategies, args.resamples, config['seed'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# tracker.py
+
+# To get game constants
+from config import CONSTANTS
+
+# Card numbering and masks
+from melds import NUM_CARDS, card_index, hand_mask
+
+# To read engine states
+from engine import cards_of
+
+ALL_CARDS = (1 << NUM_CARDS) - 1
+
+# Where an unseen card can be, besides another player's hand
+DECK = 'deck'
+
+
+# Tracks which cards a seat has seen (its hand, the discard pile, every exposed meld) and where the rest may be.
+# Updates touch only the cards that changed, so it can be updated from every gamestate; chance() is a constant-time
+# lookup. Every unseen card is equally likely to be any of the hidden cards, so the chance an unseen card is in a
+# place is the share of the hidden cards that place holds.
+class CardTracker:
+    # player may be left out when it is learned from the first gamestate
+    def __init__(self, player=None, num_players=CONSTANTS.NUM_PLAYERS):
+        self.player = player
+        self.num_players = num_players
+        self.reset()
+    
+    
+    # Forget everything (a new game started)
+    def reset(self):
+        self.hand = 0
+        self.discard = list()
+        self.discard_mask = 0
+        self.exposed = 0
+        
+        # Meld masks and sizes of each player, and the cards each player picked up from the discard (which the discard
+        # advisor reads as the melds they are building)
+        self.melds = [list() for _ in range(self.num_players)]
+        self.meld_sizes = [list() for _ in range(self.num_players)]
+        self.picked = [0] * self.num_players
+        
+        # Hidden cards in the deck and in each hand
+        self.deck_size = None
+        self.num_cards = [0] * self.num_players
+        
+        self.unseen = ALL_CARDS
+        self.hidden = 0
+        self.shares = dict()
+        self.version = 0
+        self._chances = dict()
+    
+    
+    # Update from a gamestate and its player messages
+    def update(self, gamestate, players):
+        self.player = gamestate['id']
+        melds = [[meld for meld in player['melds'] if meld] for player in players]
+        num_cards = [len(players[i]['hand']) if i == self.player else players[i]['num_cards'] for i in range(len(players))]
+        self._update(gamestate['discard'], melds, players[self.player]['hand'], num_cards, gamestate['deck_size'])
+    
+    
+    # Update from the host's Server
+    def update_server(self, server):
+        melds = [player.melds for player in server.players]
+        num_cards = [len(player.hand) for player in server.players]
+        self._update(server.discard, melds, server.players[self.player].hand, num_cards, len(server.deck))
+    
+    
+    # Update from an engine state
+    def update_state(self, state):
+        melds = [[cards_of(meld) for meld in melds] for melds in state.melds]
+        num_cards = [hand.bit_count() for hand in state.hands]
+        self._update(state.discard, melds, cards_of(state.hands[self.player]), num_cards, state.cursor)
+    
+    
+    def _update(self, discard, melds, hand, num_cards, deck_size):
+        # The deck only shrinks and melds only grow during a game
+        if self.deck_size != None and (deck_size > self.deck_size or any(len(melds[i]) < len(self.melds[i]) for i in range(len(melds)))):
+            self.reset()
+        
+        # Discard pile: a card is discarded at most once per game, so below the highest position that still holds
+        # the same card nothing changed
+        same = min(len(self.discard), len(discard))
+        while same and self.discard[same - 1] != card_index(discard[same - 1]):
+            same -= 1
+        
+        popped = 0
+        for card in self.discard[same:]:
+            popped |= 1 << card
+        del self.discard[same:]
+        self.discard_mask &= ~popped
+        
+        for card in discard[same:]:
+            self.discard.append(card_index(card))
+            self.discard_mask |= 1 << self.discard[-1]
+        
+        # Melds: new melds, and melds that grew by lay-offs
+        for i in range(len(melds)):
+            for meld_id in range(len(melds[i])):
+                if meld_id < len(self.meld_sizes[i]) and len(melds[i][meld_id]) == self.meld_sizes[i][meld_id]:
+                    continue
+                
+                mask = hand_mask(melds[i][meld_id])
+                if meld_id < len(self.meld_sizes[i]):
+                    self.melds[i][meld_id] = mask
+                    self.meld_sizes[i][meld_id] = len(melds[i][meld_id])
+                else:
+                    self.melds[i].append(mask)
+                    self.meld_sizes[i].append(len(melds[i][meld_id]))
+                    
+                    # A new meld holding a card taken off the discard was picked up by its owner
+                    self.picked[i] |= mask & popped
+                
+                self.exposed |= mask
+        
+        self.hand = hand_mask(hand)
+        self.num_cards = list(num_cards)
+        self.deck_size = deck_size
+        
+        self.unseen = ALL_CARDS & ~(self.hand | self.discard_mask | self.exposed)
+        self.hidden = deck_size + sum(num_cards[i] for i in range(len(num_cards)) if i != self.player)
+        self.shares = {i: num_cards[i] / self.hidden if self.hidden else 0.0 for i in range(len(num_cards)) if i != self.player}
+        self.shares[DECK] = deck_size / self.hidden if self.hidden else 0.0
+        
+        self.version += 1
+    
+    
+    # Returns the chance a card is in a place (DECK or a player id other than the tracker's)
+    def chance(self, card, where):
+        return self.shares[where] if self.unseen >> card & 1 else 0.0
+    
+    
+    # Returns the chance every card (by id) is in a place, computed once per update
+    def chances(self, where):
+        if where not in self._chances or self._chances[where][0] != self.version:
+            share = self.shares[where]
+            self._chances[where] = (self.version, tuple(share if self.unseen >> card & 1 else 0.0 for card in range(NUM_CARDS)))
+        
+        return self._chances[where][1]
+    
+    
+    # Returns the chance a place (DECK or a player id) holds every card in a mask
+    def chance_all(self, mask, where):
+        if mask & ~self.unseen:
+            return 0.0
+        
+        held = self.deck_size if where == DECK else self.num_cards[where]
+        
+        # Chance each card in turn is there given the ones before it were
+        every = 1.0
+        for i in range(mask.bit_count()):
+            every *= max(0, held - i) / (self.hidden - i)
+        
+        return every
+    
+    
+    # Returns the chance a place (DECK or a player id) holds at least one of the cards in a mask
+    def chance_any(self, mask, where):
+        held = self.deck_size if where == DECK else self.num_cards[where]
+        
+        # Chance each unseen card in turn is not there given the ones before it were not
+        none = 1.0
+        for i in range((mask & self.unseen).bit_count()):
+            none *= max(0, self.hidden - held - i) / (self.hidden - i)
+        
+        return 1.0 - none